@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+"""
+Time the 'lspci -D -vmm -nn' parser of the wizard on a listing, by default
+'lspci-2000.txt' of this directory: 2,000 devices of GPU nodes (bridges,
+GPUs with their audio function, NVMe, NICs and USB controllers).
+
+With --lspci, the 'lspci' run of the host is timed too, which is the main
+cost of the device listing. The wizard dependencies (toml, tomli_w,
+pythondialog and the 'dialog' program) are needed to load it.
+"""
+
+import argparse
+import importlib.util
+import statistics
+import subprocess
+import time
+import tracemalloc
+from pathlib import Path
+
+LOCALDIR = Path(__file__).resolve().parent
+GOLEMWZ_PATH = LOCALDIR.parent / "rootfs" / "golemwz.py"
+
+
+def load_golemwz():
+    spec = importlib.util.spec_from_file_location("golemwz", GOLEMWZ_PATH)
+    golemwz = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(golemwz)
+    return golemwz
+
+
+def time_runs(func, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return result, statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument(
+        "listing",
+        nargs="?",
+        type=Path,
+        default=LOCALDIR / "lspci-2000.txt",
+        help="'lspci -D -vmm -nn' output",
+    )
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument(
+        "--lspci", action="store_true", help="Time 'lspci' of the host too"
+    )
+    args = parser.parse_args()
+
+    golemwz = load_golemwz()
+    lines = args.listing.read_text().splitlines(keepends=True)
+
+    def parse():
+        return list(golemwz.PCIParser._parse_lspci(iter(lines)))
+
+    devices, parse_ms = time_runs(parse, args.runs)
+    tracemalloc.start()
+    parse()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"devices: {len(devices)}")
+    print(f"parse: {parse_ms:.1f} ms (median of {args.runs} runs)")
+    print(f"parse peak memory: {peak / 1024:.0f} KiB")
+
+    if args.lspci:
+        _, lspci_ms = time_runs(
+            lambda: subprocess.run(
+                ["lspci", "-D", "-vmm", "-nn"],
+                stdout=subprocess.DEVNULL,
+                check=True,
+            ),
+            args.runs,
+        )
+        print(f"lspci: {lspci_ms:.1f} ms (median of {args.runs} runs)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/bin/bash
+
+# Boot a GOLEM live image under QEMU without KVM nor GPU and wait for it to
+# reach the serial console login prompt. The kernel and initrd are taken from
+# the assembled rootfs so that the console can be redirected to serial.
+# With 'netboot' as image, the network boot artifacts are served over HTTP
+# and the root filesystem is fetched like on a network booted node.
+# An ISO image is attached as a CD-ROM and first booted through the firmware
+# up to the GRUB menu, mirrored on serial, to check the El Torito boot.
+
+set -eu -o pipefail
+
+if [ $# -lt 1 ]; then
+    echo "Usage: $0 <image|iso|netboot> [<extra kernel parameters>]"
+    exit 1
+fi
+
+LOCALDIR="$(readlink -f "$(dirname "$0")")"
+WORKDIR="${WORKDIR:-"${LOCALDIR}/work"}"
+IMAGE_LAYOUT="${IMAGE_LAYOUT:-ext4}"
+QEMU_TIMEOUT="${QEMU_TIMEOUT:-900}"
+QEMU_MEMORY="${QEMU_MEMORY:-4096}"
+NETBOOT_PORT="${NETBOOT_PORT:-8080}"
+NETBOOT_MAC="52:54:00:12:34:56"
+IMG="$1"
+EXTRA_APPEND="${2:-}"
+SERIAL_LOG="$(mktemp)"
+
+if [ "${IMG}" == "netboot" ]; then
+    # HTTP stand-in for the boot server, reached from QEMU user network
+    python3 -m http.server --directory "${WORKDIR}/netboot" "${NETBOOT_PORT}" &
+    HTTP_PID=$!
+    BASE_URL="http://10.0.2.2:${NETBOOT_PORT}"
+    BOOT_DIR="${WORKDIR}/netboot"
+    APPEND="boot=live ip=dhcp fetch=${BASE_URL}/filesystem.squashfs golemwz.conf_url=${BASE_URL}/conf/${NETBOOT_MAC}.toml"
+    QEMU_ARGS=(-nic "user,model=virtio-net-pci,mac=${NETBOOT_MAC}")
+elif [[ "${IMG}" == *.iso ]]; then
+    BOOT_DIR="${WORKDIR}/rootfs/boot"
+    APPEND="boot=live"
+    QEMU_ARGS=(-cdrom "${IMG}")
+else
+    BOOT_DIR="${WORKDIR}/rootfs/boot"
+    if [ "${IMAGE_LAYOUT}" == "squashfs" ]; then
+        APPEND="boot=live"
+    else
+        APPEND="root=UUID=90a495f3-c8ce-45c6-97ac-3bd5edf3aebd"
+    fi
+    QEMU_ARGS=(-drive "file=${IMG},format=raw,if=virtio,snapshot=on")
+fi
+APPEND="${APPEND} console=ttyS0 skip_autostart ${EXTRA_APPEND}"
+
+trap 'kill ${QEMU_PID:-} ${HTTP_PID:-} 2>/dev/null || true; rm -f "${SERIAL_LOG}"' 0 1 2 3 6 15
+
+wait_for_serial() {
+    # Wait for a pattern on the serial console of the running QEMU
+    local pattern="$1"
+    local start
+    start=$(date +%s)
+    while ! grep -q "${pattern}" "${SERIAL_LOG}"; do
+        if ! kill -0 "${QEMU_PID}" 2>/dev/null || [ $(($(date +%s) - start)) -ge "${QEMU_TIMEOUT}" ]; then
+            cat "${SERIAL_LOG}"
+            echo "ERROR: ${IMG} did not boot."
+            exit 1
+        fi
+        sleep 1
+    done
+    echo "${IMG} reached '${pattern}' in $(($(date +%s) - start))s."
+}
+
+if [[ "${IMG}" == *.iso ]]; then
+    qemu-system-x86_64 \
+        -machine q35,accel=tcg \
+        -m "${QEMU_MEMORY}" \
+        -display none \
+        -no-reboot \
+        -serial "file:${SERIAL_LOG}" \
+        -boot d \
+        "${QEMU_ARGS[@]}" &
+    QEMU_PID=$!
+    wait_for_serial "GOLEM GPU Live"
+    kill "${QEMU_PID}"
+    wait "${QEMU_PID}" || true
+    : > "${SERIAL_LOG}"
+fi
+
+qemu-system-x86_64 \
+    -machine q35,accel=tcg \
+    -m "${QEMU_MEMORY}" \
+    -smp 2 \
+    -display none \
+    -no-reboot \
+    -serial "file:${SERIAL_LOG}" \
+    -kernel "${BOOT_DIR}/vmlinuz" \
+    -initrd "${BOOT_DIR}/initrd.img" \
+    -append "${APPEND}" \
+    "${QEMU_ARGS[@]}" &
+QEMU_PID=$!
+
+wait_for_serial "login:"
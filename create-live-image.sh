@@ -7,6 +7,9 @@ WORKDIR="${1:-"${LOCALDIR}/work"}"
 VERSION="${2:-"$(date --utc +%y%m%dT%H%M%SZ)"}"
 IMG="${WORKDIR}/golem-gpu-live-${VERSION}.img"
 MNTDIR="${WORKDIR}/mnt"
+# 'ext4' root filesystem or 'squashfs' root with live-boot overlay
+IMAGE_LAYOUT="${IMAGE_LAYOUT:-ext4}"
+SQUASHFS="${WORKDIR}/filesystem.squashfs"
 
 function cleanup() {
     local mountdir="$1"
@@ -30,6 +33,17 @@ rm -rf "${WORKDIR}/golem-gpu-live-*.img"
 # Trap for cleanup mount points
 trap "cleanup ${MNTDIR}" 0 1 2 3 6 15
 
+if [ "${IMAGE_LAYOUT}" == "squashfs" ]; then
+    if [ ! -f "${SQUASHFS}" ]; then
+        echo "ERROR: '${SQUASHFS}' not found, run create-squashfs.sh first."
+        exit 1
+    fi
+    # Room for the squashfs, kernel and initrd
+    ROOT_SIZE=$(( $(stat -c %s "${SQUASHFS}") / 1024 / 1024 + 512 ))
+else
+    ROOT_SIZE=10000
+fi
+
 truncate -s 16G "${IMG}"
 
 # have static UUIDs to make partition table reproducible
@@ -40,7 +54,7 @@ label-id: f4796a2a-e377-45bd-b539-d6d49e569055
 size=200MiB, type=C12A7328-F81F-11D2-BA4B-00A0C93EC93B, uuid=fa4d6529-56da-47c7-ae88-e2dfecb72621, name="EFI System"
 size=2MiB, type=21686148-6449-6E6F-744E-656564454649, uuid=1e6c9db4-1e91-46c4-846a-2030dcb13b8c, name="BIOS boot partition"
 size=1MiB, type=0FC63DAF-8483-4772-8E79-3D69D8477DE4, uuid=33b921b8-edc5-46a0-8baa-d0b7ad84fc71, name="Golem conf storage"
-size=10000MiB, type=0FC63DAF-8483-4772-8E79-3D69D8477DE4, uuid=693244e6-3e07-47bf-ad79-acade4293fe7, name="Golem root filesystem"
+size=${ROOT_SIZE}MiB, type=0FC63DAF-8483-4772-8E79-3D69D8477DE4, uuid=693244e6-3e07-47bf-ad79-acade4293fe7, name="Golem root filesystem"
 type=0FC63DAF-8483-4772-8E79-3D69D8477DE4, uuid=9b06e23f-74bb-4c49-b83d-d3b0c0c2bb01, name="Golem storage"
 EOF
 
@@ -62,12 +76,19 @@ udevadm settle --exit-if-exists="$IMG_DEV"
 mkdir -p "${MNTDIR}"
 mount "${IMG_DEV}" "${MNTDIR}"
 
-# Copy rootfs
-rsync -a "${WORKDIR}/rootfs/" "${MNTDIR}/"
-
-# Fixes
-echo golem-provider > "${MNTDIR}/etc/hostname"
-ln -sf /run/systemd/resolve/stub-resolv.conf "${MNTDIR}/etc/resolv.conf"
+if [ "${IMAGE_LAYOUT}" == "squashfs" ]; then
+    # Copy compressed rootfs where live-boot looks for it
+    mkdir -p "${MNTDIR}/live" "${MNTDIR}/boot"
+    cp "${SQUASHFS}" "${MNTDIR}/live/filesystem.squashfs"
+    cp -L "${WORKDIR}/rootfs/boot/vmlinuz" "${WORKDIR}/rootfs/boot/initrd.img" "${MNTDIR}/boot/"
+else
+    # Copy rootfs
+    rsync -a "${WORKDIR}/rootfs/" "${MNTDIR}/"
+
+    # Fixes
+    echo golem-provider > "${MNTDIR}/etc/hostname"
+    ln -sf /run/systemd/resolve/stub-resolv.conf "${MNTDIR}/etc/resolv.conf"
+fi
 
 # Create EFI mount point
 mkdir -p "${MNTDIR}/boot/efi/"
@@ -0,0 +1,75 @@
+#!/bin/bash
+
+# Build a hybrid BIOS/UEFI ISO, bootable from a CD or a USB stick, from the
+# root squashfs and the GRUB and shim files of the assembled rootfs, in a
+# single xorriso pass.
+
+set -eux -o pipefail
+
+LOCALDIR="$(readlink -f "$(dirname "$0")")"
+WORKDIR="${1:-"${LOCALDIR}/work"}"
+VERSION="${2:-"$(date --utc +%y%m%dT%H%M%SZ)"}"
+ISO="${WORKDIR}/golem-gpu-live-${VERSION}.iso"
+SQUASHFS="${WORKDIR}/filesystem.squashfs"
+ISODIR="${WORKDIR}/iso"
+EFI_IMG="${WORKDIR}/efi.img"
+# BIOS GRUB is not part of the rootfs, it is taken from the host
+GRUB_BIOS_DIR="/usr/lib/grub/i386-pc"
+
+if [ ! -f "${SQUASHFS}" ]; then
+    echo "ERROR: '${SQUASHFS}' not found, run create-squashfs.sh first."
+    exit 1
+fi
+
+# Cleanup
+rm -rf "${ISODIR}" "${EFI_IMG}" "${WORKDIR}"/golem-gpu-live-*.iso
+
+mkdir -p "${ISODIR}/live" "${ISODIR}/boot/grub" "${ISODIR}/.disk"
+
+# Same root filesystem, kernel and boot menu as the squashfs disk image
+cp --reflink=auto "${SQUASHFS}" "${ISODIR}/live/filesystem.squashfs"
+cp -L "${WORKDIR}/rootfs/boot/vmlinuz" "${WORKDIR}/rootfs/boot/initrd.img" "${ISODIR}/boot/"
+cp "${LOCALDIR}/live/grub.cfg" "${ISODIR}/boot/grub/"
+cp -r "${WORKDIR}/rootfs/usr/lib/grub/x86_64-efi" "${ISODIR}/boot/grub/"
+cp -r "${GRUB_BIOS_DIR}" "${ISODIR}/boot/grub/"
+
+# flag file used by grubx64.EFI to find the boot filesystem
+echo "Golem Live ISO" > "${ISODIR}/.disk/info"
+
+# UEFI: shim and signed GRUB in an EFI system partition image
+truncate -s 8M "${EFI_IMG}"
+/sbin/mkfs.vfat "${EFI_IMG}"
+mmd -i "${EFI_IMG}" ::/EFI ::/EFI/BOOT
+mcopy -i "${EFI_IMG}" "${WORKDIR}/rootfs/usr/lib/shim/shimx64.efi.signed.latest" ::/EFI/BOOT/BOOTx64.EFI
+mcopy -i "${EFI_IMG}" "${WORKDIR}/rootfs/usr/lib/grub/x86_64-efi-signed/gcdx64.efi.signed" ::/EFI/BOOT/grubx64.efi
+
+# BIOS: El Torito GRUB image loading the same boot menu
+grub-mkimage \
+    -O i386-pc-eltorito \
+    -d "${GRUB_BIOS_DIR}" \
+    -p /boot/grub \
+    -o "${ISODIR}/boot/grub/bios.img" \
+    biosdisk iso9660 part_gpt part_msdos fat normal configfile search
+
+xorriso -as mkisofs \
+    -r \
+    -V "GOLEM_GPU_LIVE" \
+    -o "${ISO}" \
+    --grub2-mbr "${GRUB_BIOS_DIR}/boot_hybrid.img" \
+    -partition_offset 16 \
+    --mbr-force-bootable \
+    -append_partition 2 28732ac11ff8d211ba4b00a0c93ec93b "${EFI_IMG}" \
+    -appended_part_as_gpt \
+    -iso_mbr_part_type a2a0d0ebe5b9334487c068b6b72699c7 \
+    -c boot/boot.cat \
+    -b boot/grub/bios.img \
+    -no-emul-boot \
+    -boot-load-size 4 \
+    -boot-info-table \
+    --grub2-boot-info \
+    -eltorito-alt-boot \
+    -e "--interval:appended_partition_2:::" \
+    -no-emul-boot \
+    "${ISODIR}"
+
+rm -rf "${ISODIR}" "${EFI_IMG}"
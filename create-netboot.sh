@@ -0,0 +1,58 @@
+#!/bin/bash
+
+# Emit network boot artifacts: kernel, initrd and root squashfs with iPXE and
+# GRUB configurations. Serve the output directory over HTTP at NETBOOT_PATH
+# and put per-node wizard configurations in its 'conf' directory, named after
+# the MAC address of the boot interface (e.g. 'conf/52:54:00:12:34:56.toml').
+
+set -eux -o pipefail
+
+LOCALDIR="$(readlink -f "$(dirname "$0")")"
+WORKDIR="${1:-"${LOCALDIR}/work"}"
+SQUASHFS="${WORKDIR}/filesystem.squashfs"
+NETBOOT_DIR="${WORKDIR}/netboot"
+# HTTP server, by default the boot server given by DHCP
+NETBOOT_SERVER="${NETBOOT_SERVER:-}"
+NETBOOT_PATH="${NETBOOT_PATH:-/golem-gpu-live}"
+CMDLINE="boot=live ip=dhcp intel_iommu=on amd_iommu=on quiet"
+
+if [ ! -f "${SQUASHFS}" ]; then
+    echo "ERROR: '${SQUASHFS}' not found, run create-squashfs.sh first."
+    exit 1
+fi
+
+rm -rf "${NETBOOT_DIR}"
+mkdir -p "${NETBOOT_DIR}/conf"
+
+cp -L "${WORKDIR}/rootfs/boot/vmlinuz" "${WORKDIR}/rootfs/boot/initrd.img" "${NETBOOT_DIR}/"
+cp --reflink=auto "${SQUASHFS}" "${NETBOOT_DIR}/filesystem.squashfs"
+
+cat > "${NETBOOT_DIR}/boot.ipxe" << EOF
+#!ipxe
+dhcp
+set base-url http://${NETBOOT_SERVER:-"\${next-server}"}${NETBOOT_PATH}
+kernel \${base-url}/vmlinuz ${CMDLINE} fetch=\${base-url}/filesystem.squashfs golemwz.conf_url=\${base-url}/conf/\${net0/mac}.toml
+initrd \${base-url}/initrd.img
+boot
+EOF
+
+cat > "${NETBOOT_DIR}/grub.cfg" << EOF
+insmod http
+set timeout=5
+set golem_server="${NETBOOT_SERVER:-"\${net_default_server}"}"
+set golem_url="http://\${golem_server}${NETBOOT_PATH}"
+export golem_server golem_url
+
+menuentry "GOLEM GPU Live -- NETWORK BOOT" {
+    linux (http,\${golem_server})${NETBOOT_PATH}/vmlinuz ${CMDLINE} fetch=\${golem_url}/filesystem.squashfs golemwz.conf_url=\${golem_url}/conf/\${net_default_mac}.toml
+    initrd (http,\${golem_server})${NETBOOT_PATH}/initrd.img
+}
+EOF
+
+cat > "${NETBOOT_DIR}/conf/example.toml" << EOF
+#accepted_terms = true
+#glm_account = "0x..."
+#glm_per_hour = "0.25"
+# 'golem' user password, from 'openssl passwd -6'
+#password_hash = "\$6\$..."
+EOF
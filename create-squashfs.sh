@@ -0,0 +1,25 @@
+#!/bin/bash
+
+# Compress the assembled root filesystem for the live-boot layouts (squashfs
+# image, ISO and netboot).
+
+set -eux -o pipefail
+
+LOCALDIR="$(readlink -f "$(dirname "$0")")"
+WORKDIR="${1:-"${LOCALDIR}/work"}"
+SQUASHFS="${WORKDIR}/filesystem.squashfs"
+
+# Fixes
+echo golem-provider > "${WORKDIR}/rootfs/etc/hostname"
+ln -sf /run/systemd/resolve/stub-resolv.conf "${WORKDIR}/rootfs/etc/resolv.conf"
+
+rm -f "${SQUASHFS}"
+
+# live-boot mounts an overlay as root filesystem, replace the ext4 fstab entry
+mksquashfs "${WORKDIR}/rootfs" "${SQUASHFS}" \
+    -noappend \
+    -comp zstd \
+    -Xcompression-level 19 \
+    -b 1M \
+    -e etc/fstab \
+    -p "etc/fstab f 644 0 0 echo overlay / overlay rw 0 0"
@@ -59,7 +59,21 @@ read -r -a rootfs_layers <<< "$(jq -r '.[0].Layers | join(" ")' "$manifest_file"
 # Step 4: Extract the root filesystem layer from the manifest
 mkdir "$tmp_directory/rootfs"
 for rootfs_layer in "${rootfs_layers[@]}"; do
-    tar -xf "$tmp_directory/image_extraction/$rootfs_layer" -C "$tmp_directory/rootfs"
+    layer_file="$tmp_directory/image_extraction/$rootfs_layer"
+    # Apply the whiteouts of the layer to the lower layers
+    while IFS= read -r whiteout; do
+        whiteout_dir="$tmp_directory/rootfs/$(dirname "$whiteout")"
+        whiteout_name="$(basename "$whiteout")"
+        if [ "$whiteout_name" == ".wh..wh..opq" ]; then
+            # Opaque directory
+            if [ -d "$whiteout_dir" ]; then
+                find "$whiteout_dir" -mindepth 1 -maxdepth 1 -exec rm -rf {} +
+            fi
+        else
+            rm -rf "${whiteout_dir:?}/${whiteout_name#.wh.}"
+        fi
+    done < <(tar -tf "$layer_file" | grep -E '(^|/)\.wh\.[^/]*$' || true)
+    tar -xf "$layer_file" -C "$tmp_directory/rootfs"
 done
 
 # Cleanup aufs stuff
@@ -1,13 +1,10 @@
 #!/bin/bash
 
-sleep 3
-
 function exit_wrapper {
     sudo /usr/bin/chvt 1
 }
 
 trap 'exit_wrapper' 0 1 2 3 6 15
 
-sudo /usr/bin/chvt 6
-
+# The wizard switches to tty6 itself when user interaction is needed
 /usr/local/bin/golemwz
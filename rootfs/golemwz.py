@@ -1,19 +1,35 @@
 #!/usr/bin/python3
 import argparse
+import contextlib
+import errno
+import fcntl
 import glob
+import hashlib
+import itertools
 import json
 import locale
 import logging
+import math
+import mmap
 import os
 import random
 import re
 import shutil
+import socket
+import socketserver
 import string
+import statistics
 import subprocess
 import sys
+import tempfile
+import threading
 import time
+import urllib.request
+import uuid
 import toml
 import tomli_w
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 from textwrap import wrap
 
@@ -34,9 +50,118 @@ PCI_VGA_CLASS_ID = "0300"
 
 RELAXED_PCI_CLASSES = [PCI_HOST_BRIDGE_CLASS_ID, PCI_BUS_BRIDGE_CLASS_ID]
 
+# Drivers which don't prevent an IOMMU group from being assigned to a VM
+VFIO_VIABLE_DRIVERS = [None, "vfio-pci", "pci-stub", "pcieport"]
+# _IO(VFIO_TYPE, VFIO_BASE + 3)
+VFIO_GROUP_GET_STATUS = 0x3B67
+VFIO_GROUP_FLAGS_VIABLE = 1 << 0
+
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_KERNEL_GROUP = 1
+UEVENT_BUFFER_SIZE = 64 * 1024
+
 DURATION_GLM_PER_HOUR_DEFAULT = 1.0
 CPU_GLM_PER_HOUR_DEFAULT = 0.0
 
+STORAGE_BENCH_TIME_BUDGET = 3.0
+STORAGE_BENCH_SEQ_READ_MAX = 256 * 1024 * 1024
+STORAGE_BENCH_RANDOM_OPS_MAX = 1024
+STORAGE_BENCH_WRITE_FILE_SIZE = 16 * 1024 * 1024
+
+STRIPE_MD_DEVICE = "/dev/md/golem-storage"
+STRIPE_CHUNK_KIB = 512
+
+# RAM kept for the host and for each GPU VM when sizing scratch storage
+SCRATCH_HOST_RESERVED_MEMORY = 4 * 1024**3
+SCRATCH_VM_MEMORY_PER_GPU = 16 * 1024**3
+SCRATCH_MIN_SIZE = 8 * 1024**3
+# Expected zstd compression ratio of provider data in zram
+SCRATCH_ZRAM_RATIO = 2
+
+# Kept for the host when sizing provider resources
+RESOURCES_HOST_CORES = 1
+RESOURCES_HOST_MEMORY = 4 * 1024**3
+# QEMU and VFIO overhead of each passthrough GPU
+RESOURCES_HOST_MEMORY_PER_GPU = 1024**3
+RESOURCES_HOST_DISK_RATIO = 0.1
+
+# Logs are buffered in RAM and archived by 'golemwz log-flush'
+LOG_BUFFER_DIR = Path("/run/golem")
+LOG_ARCHIVE_DIR = Path("~").expanduser() / ".local/share/golemwz/logs"
+LOG_ARCHIVE_MAX_BYTES = 256 * 1024**2
+
+# Runtime power management of idle passthrough GPUs
+POWER_STATE_PATH = LOG_BUFFER_DIR / "power.json"
+POWER_INTERVAL_DEFAULT = 10.0
+POWER_WAKE_BUDGET_MS = 500.0
+POWER_WAKE_TIMEOUT = 5.0
+PCI_SLOT_PATTERN = r"^[0-9a-f]{4}:[0-9a-f]{2}:[0-9a-f]{2}\.[0-7]$"
+
+# Seconds to wait for the network to fetch the node configuration
+NETBOOT_CONF_TIMEOUT = 60
+
+BOOT_REPORT_PATH = Path("~").expanduser() / "golemwz-boot.json"
+
+# Kernel parameters sourced by GRUB from the configuration partition
+KERNEL_PROFILE_PATH = Path("/mnt/golemwz-cmdline.cfg")
+KERNEL_PROFILE_GRUBENV_PATH = Path("/mnt/grubenv")
+KERNEL_PROFILE_PARAMETERS = [
+    "intel_iommu",
+    "amd_iommu",
+    "iommu",
+    "video",
+    "vfio-pci.disable_vga",
+    "console",
+    "golemwz.vfio",
+    "golemwz.profile",
+]
+
+# Overridable with a 'network_probe' table in the wizard configuration
+NETWORK_PROBE_DEFAULTS = {
+    "endpoints": [
+        "registry.golem.network:443",
+        "gpu-live.cdn.golem.network:443",
+    ],
+    # Relays are reached over UDP, they are pinged
+    "relay_endpoints": ["yacn2.dev.golem.network"],
+    # Without 'download_url', the largest package of the APT repository
+    "download_url": None,
+    "download_repository": "https://gpu-live.cdn.golem.network/release",
+    "samples": 5,
+    # Fixed size ranged download, so results of nodes compare
+    "download_max_bytes": 64 * 1024 * 1024,
+    "download_max_seconds": 10.0,
+    # Thresholds, 0 disables them
+    "max_rtt_ms": 0,
+    "min_download_mbps": 0,
+    # 'warn' or 'pause' onboarding when a threshold is not met
+    "action": "warn",
+}
+
+# Processes (comm prefixes) running while the provider computes a task
+PROVIDER_ACTIVITY_COMMANDS = [
+    "exe-unit",
+    "ya-runtime-vm",
+    "vmrt",
+    "qemu-system-x86",
+]
+UPGRADE_GATE_STATE_PATH = Path("/var/lib/golemwz/upgrade-gate.json")
+UPGRADE_MAX_DEFERRAL_HOURS = 72.0
+
+CONTROL_SOCKET_PATH = Path("/run/golemwz/control.sock")
+# Held by the wizard and the control daemon while they update its
+# configuration
+WIZARD_CONF_LOCK_PATH = Path("/run/lock/golemwz.lock")
+
+# Bumped on any incompatible change of the 'inventory' output
+INVENTORY_SCHEMA_VERSION = 1
+INVENTORY_CACHE_PATH = Path("~").expanduser() / ".cache/golemwz/inventory.json"
+# Kept on the persistent storage, the image has no machine-id of its own
+MACHINE_ID_PATH = Path("~").expanduser() / ".local/share/golemwz/machine-id"
+
+MONITOR_LISTEN_DEFAULT = "127.0.0.1:9464"
+MONITOR_INTERVAL_DEFAULT = 15.0
+
 logger = logging.getLogger(__name__)
 
 MSG_FREEZE = (
@@ -90,11 +215,149 @@ def parse_args():
         default=False,
         help="Don't save running configuration.",
     )
+
+    subparsers = parser.add_subparsers(dest="command")
+
+    monitor_parser = subparsers.add_parser(
+        "monitor",
+        help="Serve host and GPU passthrough health metrics.",
+    )
+    monitor_parser.add_argument(
+        "--listen",
+        default=MONITOR_LISTEN_DEFAULT,
+        help="'HOST:PORT' or 'unix:PATH' to serve Prometheus metrics on.",
+    )
+    monitor_parser.add_argument(
+        "--interval",
+        type=float,
+        default=MONITOR_INTERVAL_DEFAULT,
+        help="Seconds between two samples.",
+    )
+
+    storage_bench_parser = subparsers.add_parser(
+        "storage-bench",
+        help="Measure read/write performance of a partition (as root).",
+    )
+    storage_bench_parser.add_argument("devname", help="Partition to measure.")
+    storage_bench_parser.add_argument(
+        "--time-budget",
+        type=float,
+        default=STORAGE_BENCH_TIME_BUDGET,
+        help="Maximum number of seconds to spend measuring.",
+    )
+
+    subparsers.add_parser(
+        "boot-report", help="Show milestones of the last wizard boot."
+    )
+
+    upgrade_gate_parser = subparsers.add_parser(
+        "upgrade-gate",
+        help="Exit with 0 if unattended upgrades may run now, 1 otherwise.",
+    )
+    upgrade_gate_parser.add_argument(
+        "--max-deferral",
+        type=float,
+        default=UPGRADE_MAX_DEFERRAL_HOURS,
+        help="Hours after which upgrades run even if the provider is busy.",
+    )
+    upgrade_gate_parser.add_argument(
+        "--state", type=Path, default=UPGRADE_GATE_STATE_PATH
+    )
+    upgrade_gate_parser.add_argument("--proc-root", default="/proc")
+
+    control_daemon_parser = subparsers.add_parser(
+        "control-daemon",
+        help="Serve live reconfiguration requests of a running node.",
+    )
+    control_daemon_parser.add_argument(
+        "--socket", type=Path, default=CONTROL_SOCKET_PATH
+    )
+
+    control_parser = subparsers.add_parser(
+        "control",
+        help="Send a request to the control daemon.",
+    )
+    control_parser.add_argument(
+        "op",
+        choices=sorted(ControlService.operations),
+        help="Operation to apply.",
+    )
+    control_parser.add_argument(
+        "params",
+        nargs="*",
+        metavar="KEY=VALUE",
+        help="Operation parameters, e.g. 'glm_per_hour=0.5' or "
+        "'slot=0000:01:00.0'.",
+    )
+    control_parser.add_argument(
+        "--socket", type=Path, default=CONTROL_SOCKET_PATH
+    )
+
+    power_manager_parser = subparsers.add_parser(
+        "power-manager",
+        help="Let idle passthrough GPUs enter runtime suspend (as root).",
+    )
+    power_manager_parser.add_argument(
+        "--interval",
+        type=float,
+        default=POWER_INTERVAL_DEFAULT,
+        help="Seconds between two checks of GPU activity.",
+    )
+    power_manager_parser.add_argument(
+        "--wake-budget-ms",
+        type=float,
+        default=POWER_WAKE_BUDGET_MS,
+        help="GPUs waking up slower than this are kept awake.",
+    )
+    power_manager_parser.add_argument(
+        "--once", action="store_true", help="Check once and exit."
+    )
+    power_manager_parser.add_argument("--sysfs-root", default="/sys")
+    power_manager_parser.add_argument("--proc-root", default="/proc")
+    power_manager_parser.add_argument(
+        "--state", type=Path, default=POWER_STATE_PATH
+    )
+
+    inventory_parser = subparsers.add_parser(
+        "inventory",
+        help="Show GPUs, their isolation, host and storage capacity.",
+    )
+    inventory_parser.add_argument(
+        "--json", action="store_true", help="Output the inventory as JSON."
+    )
+    inventory_parser.add_argument(
+        "--cache", type=Path, default=INVENTORY_CACHE_PATH
+    )
+
+    inventory_merge_parser = subparsers.add_parser(
+        "inventory-merge",
+        help="Merge inventories of many nodes into a fleet capacity table.",
+    )
+    inventory_merge_parser.add_argument(
+        "files", nargs="+", type=Path, help="'inventory --json' outputs."
+    )
+    inventory_merge_parser.add_argument(
+        "--json", action="store_true", help="Output the table as JSON."
+    )
+
+    log_flush_parser = subparsers.add_parser(
+        "log-flush",
+        help="Archive logs buffered in RAM to persistent storage.",
+    )
+    log_flush_parser.add_argument(
+        "--max-bytes",
+        type=int,
+        default=LOG_ARCHIVE_MAX_BYTES,
+        help="Size of archived logs above which the oldest are removed.",
+    )
     return parser.parse_args()
 
 
 def setup_logging(debug=False):
-    log_filename = Path("~").expanduser().resolve() / "golemwz.log"
+    if LOG_BUFFER_DIR.is_dir():
+        log_filename = LOG_BUFFER_DIR / "golemwz.log"
+    else:
+        log_filename = Path("~").expanduser().resolve() / "golemwz.log"
     logging.basicConfig(
         filename=log_filename,
         level=logging.DEBUG if debug else logging.INFO,
@@ -118,6 +381,7 @@ class PCIDevice:
         device,
         description=None,
         iommu_group=None,
+        driver=None,
     ):
         self.slot = slot
         self.class_code = class_code
@@ -125,6 +389,7 @@ class PCIDevice:
         self.device = device
         self.description = description
         self.iommu_group = iommu_group
+        self.driver = driver
 
         self.parent = None
         self.children = []
@@ -154,49 +419,64 @@ class PCIParser:
                 return line.split(":", 1)[-1].strip()
 
     @staticmethod
-    def _parse_lspci(lspci_output):
-        pci_devices = {}
-        device_blocks = lspci_output.strip().split("\n\n")
-
-        for block in device_blocks:
-            current_device = {}
-            for line in block.splitlines():
-                key, value = line.split(":", 1)
-                current_device[key.strip()] = value.strip()
-
-            slot = current_device.get("Slot")
-            if slot:
-                pci_devices[slot] = PCIDevice(
-                    slot=slot,
-                    class_code=current_device.get("Class", ""),
-                    vendor=current_device.get("Vendor", ""),
-                    device=current_device.get("Device", ""),
-                    iommu_group=int(current_device.get("IOMMUGroup"))
-                    if current_device.get("IOMMUGroup")
-                    else None,
-                )
-        return pci_devices
+    def _split_name_id(value):
+        # 'lspci -nn' field, e.g. 'GA102 [GeForce RTX 3090] [2204]'
+        name, sep, pci_id = value.rpartition(" [")
+        if not sep or not pci_id.endswith("]"):
+            return value, ""
+        return name, pci_id[:-1]
 
-    def _get_pci_devices(self):
-        # Run lspci to get the list of PCI devices with detailed information
-        lspci_command = ["lspci", "-D", "-vmm", "-n"]
-        lspci_output = subprocess.run(
-            lspci_command, check=True, text=True, capture_output=True
-        ).stdout
+    @classmethod
+    def _device_from_lspci(cls, fields):
+        class_name, class_code = cls._split_name_id(fields.get("Class", ""))
+        vendor_name, vendor = cls._split_name_id(fields.get("Vendor", ""))
+        device_name, device = cls._split_name_id(fields.get("Device", ""))
+        iommu_group = fields.get("IOMMUGroup")
+        return PCIDevice(
+            slot=fields["Slot"],
+            class_code=class_code,
+            vendor=vendor,
+            device=device,
+            description=f"{class_name} {vendor_name} {device_name}",
+            iommu_group=int(iommu_group) if iommu_group else None,
+        )
 
-        lspci_command = ["lspci", "-D", "-vmm"]
-        lspci_output_strings = subprocess.run(
-            lspci_command, check=True, text=True, capture_output=True
-        ).stdout
+    @classmethod
+    def _parse_lspci(cls, lspci_lines):
+        """
+        Yield the devices of 'lspci -D -vmm -nn' output, line by line, with
+        both numeric IDs and names.
+        """
+        fields = {}
+        for line in itertools.chain(lspci_lines, [""]):
+            key, sep, value = line.rstrip("\n").partition(":\t")
+            if sep:
+                fields[key] = value
+            elif not line.strip() and fields:
+                # Empty line ends a device
+                if "Slot" in fields:
+                    yield cls._device_from_lspci(fields)
+                fields = {}
 
-        pci_devices = self._parse_lspci(lspci_output)
-        pci_devices_with_strings = self._parse_lspci(lspci_output_strings)
+    def _get_pci_devices(self):
+        # Single lspci run for the numeric IDs and the names
+        lspci_command = ["lspci", "-D", "-vmm", "-nn"]
+        with subprocess.Popen(
+            lspci_command, stdout=subprocess.PIPE, text=True
+        ) as lspci:
+            pci_devices = {
+                device.slot: device
+                for device in self._parse_lspci(lspci.stdout)
+            }
+        if lspci.returncode:
+            raise subprocess.CalledProcessError(
+                lspci.returncode, lspci_command
+            )
 
-        for slot in pci_devices:
-            pci_device = pci_devices_with_strings[slot]
-            pci_devices[
-                slot
-            ].description = f"{pci_device.class_code} {pci_device.vendor} {pci_device.device}"
+        for device in pci_devices.values():
+            if device.iommu_group is None:
+                # IOMMU disabled or sysfs restricted
+                logger.warning(f"No IOMMU group for '{device.slot}'.")
 
         return pci_devices
 
@@ -220,6 +500,14 @@ class PCIParser:
                 consumer_slot = Path(consumer_path).name.lstrip("consumer:pci:")
                 if consumer_slot in pci_devices:
                     device.consumers.append(pci_devices[consumer_slot])
+            if not device.consumers and device.slot.endswith(".0"):
+                # No device links, other functions of the device are its
+                # consumers, e.g. the audio function of a GPU
+                device.consumers = [
+                    pci_devices[slot]
+                    for slot in pci_devices
+                    if slot != device.slot and slot[:-1] == device.slot[:-1]
+                ]
             device.consumers = sorted(device.consumers, key=lambda x: x.slot)
 
         return pci_devices
@@ -250,6 +538,9 @@ class PCIParser:
             devices = filter(lambda x: x.vendor == vendor, devices)
         return list(devices)
 
+    def get_group(self, iommu_group):
+        return list(self.iommu_groups.get(iommu_group, []))
+
     def get_parents(self, device):
         if device.parent:
             return self.get_parents(device.parent) + [device.parent]
@@ -263,7 +554,10 @@ class PCIParser:
         )
 
     def is_isolated(self, device, relax=False, insecure=False):
-        group_devices = set(self.iommu_groups[device.iommu_group])
+        if device.iommu_group is None:
+            # Without IOMMU group, the device can't be passed through safely
+            return insecure
+        group_devices = set(self.get_group(device.iommu_group))
         related_devices = set(self.get_related_devices(device))
         remaining_devices = group_devices.union(
             related_devices
@@ -278,10 +572,287 @@ class PCIParser:
         return False
 
 
+def parse_uevent(data):
+    fields = data.split(b"\0")
+    # Messages re-broadcast by udev don't have an 'action@devpath' header
+    if b"@" not in fields[0]:
+        return None
+    event = {}
+    for field in fields[1:]:
+        key, sep, value = field.decode(errors="replace").partition("=")
+        if sep:
+            event[key] = value
+    return event
+
+
+class UeventSource:
+    """
+    PCI uevents broadcast by the kernel on a netlink socket.
+    """
+
+    def __init__(self):
+        self.sock = socket.socket(
+            socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT
+        )
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.sock.bind((0, UEVENT_KERNEL_GROUP))
+
+    def __iter__(self):
+        while True:
+            event = parse_uevent(self.sock.recv(UEVENT_BUFFER_SIZE))
+            if event and event.get("SUBSYSTEM") == "pci":
+                yield event
+
+
+class LiveTopology(PCIParser):
+    """
+    PCI topology kept up to date from uevents.
+
+    Devices are discovered once, then add, remove, bind and unbind events
+    are applied incrementally to the device graph and the IOMMU groups, so
+    that lookups never need a new discovery. Any iterable of uevent dicts
+    can be used as event source, for example recorded events to replay.
+    Open the source before creating the topology so that no event is lost
+    in between.
+
+    Lookups take the lock and return copies. Device lists (children,
+    consumers, groups) are replaced rather than modified in place, so a
+    list obtained from a device stays consistent while events apply.
+    """
+
+    def __init__(self, sysfs_root="/sys"):
+        super().__init__()
+        self.sysfs_root = Path(sysfs_root)
+        self.lock = threading.RLock()
+        self.listeners = []
+
+        self.by_slot = {
+            device.slot: device for device in super().get_devices()
+        }
+        self.devices = self.by_slot.values()
+        for device in self.devices:
+            device.driver = _get_driver(self._device_path(device.slot))
+
+    def _device_path(self, slot):
+        return self.sysfs_root / "bus/pci/devices" / slot
+
+    def _get_description(self, slot):
+        lspci_output = subprocess.run(
+            ["lspci", "-D", "-vmm", "-nn", "-s", slot],
+            stdout=subprocess.PIPE,
+            text=True,
+        ).stdout
+        for device in self._parse_lspci(lspci_output.splitlines()):
+            return device.description
+        return ""
+
+    def _add_device(self, slot, event, description=""):
+        # Re-added device, e.g. a bridge: devices behind it stay attached
+        previous = self._remove_device(slot)
+
+        device_path = self._device_path(slot)
+        iommu_group = _get_iommu_group(device_path)
+        vendor, _, device_id = event.get("PCI_ID", "").lower().partition(":")
+        pci_class = event.get("PCI_CLASS")
+        device = PCIDevice(
+            slot=slot,
+            class_code=f"{int(pci_class, 16) >> 8:04x}" if pci_class else "",
+            vendor=vendor,
+            device=device_id,
+            iommu_group=iommu_group,
+            driver=event.get("DRIVER"),
+            description=description,
+        )
+
+        device.parent = self.by_slot.get(
+            Path(event.get("DEVPATH", "")).parent.name
+        )
+        if device.parent:
+            device.parent.children = device.parent.children + [device]
+        if previous:
+            device.children = [
+                child
+                for child in previous.children
+                if self.by_slot.get(child.slot) is child
+            ]
+            for child in device.children:
+                child.parent = device
+
+        # Device links exist in both directions, e.g. GPU and its audio
+        prefix = "consumer:pci:"
+        for consumer_path in device_path.glob(f"{prefix}*"):
+            consumer = self.by_slot.get(consumer_path.name[len(prefix) :])
+            if consumer:
+                device.consumers.append(consumer)
+        device.consumers = sorted(device.consumers, key=lambda x: x.slot)
+        for supplier_path in device_path.parent.glob(f"*/{prefix}{slot}"):
+            supplier = self.by_slot.get(supplier_path.parent.name)
+            if supplier:
+                supplier.consumers = sorted(
+                    supplier.consumers + [device], key=lambda x: x.slot
+                )
+
+        self.by_slot[slot] = device
+        if iommu_group is not None:
+            self.iommu_groups[iommu_group] = sorted(
+                self.iommu_groups[iommu_group] + [device],
+                key=lambda x: x.slot,
+            )
+        return device
+
+    def _remove_device(self, slot):
+        device = self.by_slot.pop(slot, None)
+        if not device:
+            return None
+        if device.parent and device in device.parent.children:
+            device.parent.children = [
+                x for x in device.parent.children if x is not device
+            ]
+        for child in device.children:
+            child.parent = None
+        for other in self.by_slot.values():
+            if device in other.consumers:
+                other.consumers = [
+                    x for x in other.consumers if x is not device
+                ]
+        group = self.iommu_groups.get(device.iommu_group, [])
+        if device in group:
+            group = [x for x in group if x is not device]
+            if group:
+                self.iommu_groups[device.iommu_group] = group
+            else:
+                del self.iommu_groups[device.iommu_group]
+        return device
+
+    def apply(self, event):
+        slot = event.get("PCI_SLOT_NAME")
+        action = event.get("ACTION")
+        if slot and action == "add":
+            # Not under the lock, lookups don't wait for lspci
+            description = self._get_description(slot)
+        with self.lock:
+            if not slot:
+                return None
+            elif action == "add":
+                device = self._add_device(slot, event, description)
+            elif action == "remove":
+                device = self._remove_device(slot)
+            elif action in ("bind", "unbind"):
+                device = self.by_slot.get(slot)
+                if device:
+                    device.driver = (
+                        event.get("DRIVER") if action == "bind" else None
+                    )
+            else:
+                return None
+            listeners = list(self.listeners)
+        if device:
+            for listener in listeners:
+                listener(action, device)
+        return device
+
+    def watch(self, source):
+        def consume():
+            for event in source:
+                self.apply(event)
+
+        thread = threading.Thread(target=consume, daemon=True)
+        thread.start()
+        return thread
+
+    def get_devices(self, class_code=None, vendor=None):
+        # Never discovered again, even once every device is removed
+        with self.lock:
+            devices = list(self.by_slot.values())
+        return [
+            device
+            for device in devices
+            if (not class_code or device.class_code == class_code)
+            and (not vendor or device.vendor == vendor)
+        ]
+
+    def get_device(self, slot):
+        with self.lock:
+            return self.by_slot.get(slot)
+
+    def get_related_devices(self, device):
+        with self.lock:
+            return super().get_related_devices(device)
+
+    def get_driver(self, slot):
+        with self.lock:
+            device = self.by_slot.get(slot)
+            return device.driver if device else None
+
+    def get_group(self, iommu_group):
+        with self.lock:
+            return super().get_group(iommu_group)
+
+
 class WizardError(Exception):
     pass
 
 
+def sd_notify(state):
+    notify_socket = os.environ.get("NOTIFY_SOCKET", None)
+    if not notify_socket:
+        return False
+    if notify_socket.startswith("@"):
+        notify_socket = "\0" + notify_socket[1:]
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.connect(notify_socket)
+            sock.sendall(state.encode())
+    except OSError as e:
+        logger.debug(f"Failed to notify systemd: {str(e)}")
+        return False
+    return True
+
+
+class BootReport:
+    """
+    Timeline of the wizard milestones, in seconds since boot, forwarded to
+    systemd as status updates.
+    """
+
+    def __init__(self, report_path=BOOT_REPORT_PATH):
+        self.report_path = Path(report_path)
+        self.milestones = {}
+        self.results = {}
+        self.is_ready = False
+
+    def milestone(self, name, status=None):
+        self.milestones[name] = round(
+            time.clock_gettime(time.CLOCK_BOOTTIME), 3
+        )
+        logger.debug(f"Milestone '{name}' reached.")
+        sd_notify(f"STATUS={status or name}")
+
+    def ready(self):
+        # Let services ordered after the wizard start
+        if not self.is_ready:
+            self.milestone("ready")
+            sd_notify("READY=1")
+            self.is_ready = True
+
+    def save(self):
+        report = {"milestones": self.milestones, "results": self.results}
+        try:
+            self.report_path.write_text(json.dumps(report, indent=4))
+        except OSError as e:
+            logger.error(f"Failed to write boot report: {str(e)}")
+
+    @staticmethod
+    def show(report_path=BOOT_REPORT_PATH):
+        report = json.loads(Path(report_path).read_text())
+        for name, uptime in sorted(
+            report["milestones"].items(), key=lambda x: x[1]
+        ):
+            print(f"{uptime:10.3f}s  {name}")
+        for name, result in report.get("results", {}).items():
+            print(f"{name}: {json.dumps(result)}")
+
+
 def get_ip_addresses():
     ip_addresses = []
     try:
@@ -296,6 +867,290 @@ def get_ip_addresses():
     return ip_addresses
 
 
+def get_netboot_conf_url():
+    # Set by the network boot configurations, see create-netboot.sh
+    for parameter in read_sysfs("/proc/cmdline", "").split():
+        if parameter.startswith("golemwz.conf_url="):
+            return parameter.split("=", 1)[1]
+    return None
+
+
+def is_live_boot():
+    # Root filesystem is a squashfs with a volatile overlay
+    return (
+        Path("/run/live/medium").exists()
+        or get_netboot_conf_url() is not None
+    )
+
+
+def get_wizard_conf_path():
+    # With live-boot, root filesystem changes are lost on reboot so the wizard
+    # state is kept on the configuration partition
+    if get_netboot_conf_url():
+        # No configuration partition, node configuration is served
+        return Path("~").expanduser().resolve() / ".golemwz.toml"
+    if is_live_boot():
+        return Path("/mnt/.golemwz.toml")
+    return Path("~").expanduser().resolve() / ".golemwz.toml"
+
+
+def fetch_netboot_conf(url, conf_path):
+    deadline = time.monotonic() + NETBOOT_CONF_TIMEOUT
+    while True:
+        try:
+            with urllib.request.urlopen(url, timeout=10) as response:
+                conf_path.write_bytes(response.read())
+            logger.info(f"Fetched node configuration from '{url}'.")
+            return
+        except OSError as e:
+            if isinstance(e, urllib.error.HTTPError) and e.code == 404:
+                # Unknown node, configured interactively
+                logger.warning(f"No node configuration at '{url}': {str(e)}")
+                return
+            # Server not reachable yet or failing, e.g. 5xx
+            if time.monotonic() > deadline:
+                raise WizardError(
+                    f"Failed to fetch node configuration '{url}': {str(e)}"
+                )
+            time.sleep(2)
+
+
+def write_file(path, content):
+    # Write then rename so that a crash never leaves a truncated file, the
+    # temporary file is unique as several processes write the configuration
+    tmp_prefix = f".{path.name}."
+    # Configuration partition is only writable by root
+    if os.access(path.parent, os.W_OK):
+        fd, tmp_path = tempfile.mkstemp(
+            dir=path.parent, prefix=tmp_prefix, suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                # Readable like the file it replaces, not 0600
+                os.fchmod(f.fileno(), 0o644)
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+    else:
+        tmp_path = subprocess.run(
+            [
+                "sudo",
+                "mktemp",
+                "-p",
+                str(path.parent),
+                f"{tmp_prefix}XXXXXXXX.tmp",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        subprocess.run(["sudo", "chmod", "644", tmp_path], check=True)
+        subprocess.run(
+            ["sudo", "tee", tmp_path],
+            input=content,
+            text=True,
+            stdout=subprocess.DEVNULL,
+            check=True,
+        )
+        subprocess.run(["sudo", "sync", tmp_path], check=True)
+        subprocess.run(["sudo", "mv", "-f", tmp_path, str(path)], check=True)
+
+
+@contextlib.contextmanager
+def wizard_conf_lock():
+    """
+    Exclusive lock on the wizard configuration, the wizard and the control
+    daemon are separate processes which both save it.
+    """
+    fd = os.open(WIZARD_CONF_LOCK_PATH, os.O_RDONLY | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def write_wizard_conf(conf_path, wizard_conf):
+    write_file(conf_path, tomli_w.dumps(wizard_conf))
+
+
+def get_password_hash(user):
+    shadow_entry = subprocess.check_output(
+        ["sudo", "getent", "shadow", user], text=True
+    )
+    return shadow_entry.split(":")[1]
+
+
+def measure_tcp_rtt(endpoint, samples, timeout=5.0):
+    host, _, port = endpoint.rpartition(":")
+    rtts = []
+    try:
+        for _ in range(samples):
+            start = time.perf_counter()
+            with socket.create_connection((host, int(port)), timeout=timeout):
+                rtts.append((time.perf_counter() - start) * 1000)
+    except OSError as e:
+        return {"error": str(e)}
+    # Mean difference between consecutive samples
+    jitter = statistics.mean(
+        [abs(a - b) for a, b in zip(rtts, rtts[1:])] or [0.0]
+    )
+    return {
+        "rtt_ms": round(statistics.mean(rtts), 3),
+        "jitter_ms": round(jitter, 3),
+    }
+
+
+def measure_icmp_rtt(host, samples, timeout=5.0):
+    try:
+        ping = subprocess.run(
+            [
+                "ping",
+                "-n",
+                "-q",
+                "-c",
+                str(samples),
+                "-W",
+                f"{timeout:g}",
+                host,
+            ],
+            capture_output=True,
+            text=True,
+            # Parsed summary
+            env={**os.environ, "LC_ALL": "C"},
+        )
+    except OSError as e:
+        return {"error": str(e)}
+    # rtt min/avg/max/mdev = 10.1/12.3/15.2/1.8 ms
+    match = re.search(r"= [\d.]+/([\d.]+)/[\d.]+/([\d.]+) ms", ping.stdout)
+    if not match:
+        return {"error": ping.stderr.strip() or "no reply"}
+    return {
+        "rtt_ms": round(float(match.group(1)), 3),
+        "jitter_ms": round(float(match.group(2)), 3),
+    }
+
+
+def get_largest_package_url(repository_url, suite="jammy", timeout=10.0):
+    index_url = f"{repository_url}/dists/{suite}/main/binary-amd64/Packages"
+    with urllib.request.urlopen(index_url, timeout=timeout) as response:
+        index = response.read().decode()
+    largest_size, largest_filename = 0, None
+    for stanza in index.split("\n\n"):
+        fields = dict(
+            line.split(": ", 1)
+            for line in stanza.splitlines()
+            if ": " in line and not line.startswith(" ")
+        )
+        size = int(fields.get("Size", 0))
+        if "Filename" in fields and size > largest_size:
+            largest_size, largest_filename = size, fields["Filename"]
+    if not largest_filename:
+        raise OSError(f"No package in '{index_url}'")
+    return f"{repository_url}/{largest_filename}"
+
+
+def measure_download(url, max_bytes, max_seconds, timeout=10.0):
+    read_bytes = 0
+    # Servers without range support send the whole file, it is cut anyway
+    request = urllib.request.Request(
+        url, headers={"Range": f"bytes=0-{max_bytes - 1}"}
+    )
+    try:
+        start = time.perf_counter()
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            while read_bytes < max_bytes:
+                chunk = response.read(min(64 * 1024, max_bytes - read_bytes))
+                if not chunk:
+                    break
+                read_bytes += len(chunk)
+                if time.perf_counter() - start > max_seconds:
+                    break
+        elapsed = time.perf_counter() - start
+    except OSError as e:
+        return {"error": str(e)}
+    return {
+        "bytes": read_bytes,
+        "mbps": round(read_bytes * 8 / elapsed / 1e6, 3),
+    }
+
+
+class NetworkProbe(threading.Thread):
+    """
+    Measure latency and throughput towards the image and relay hosts in
+    the background while the wizard goes on.
+    """
+
+    def __init__(self, conf):
+        super().__init__(daemon=True)
+        self.conf = {**NETWORK_PROBE_DEFAULTS, **conf}
+        self.results = {}
+
+    def run(self):
+        try:
+            subprocess.run(
+                ["nm-online", "--timeout", "30", "--quiet"],
+                stdout=subprocess.DEVNULL,
+            )
+        except OSError:
+            pass
+        self.results["endpoints"] = {
+            endpoint: measure_tcp_rtt(endpoint, self.conf["samples"])
+            for endpoint in self.conf["endpoints"]
+        }
+        self.results["endpoints"].update(
+            {
+                f"{host} (relay)": measure_icmp_rtt(host, self.conf["samples"])
+                for host in self.conf["relay_endpoints"]
+            }
+        )
+        download_url = self.conf["download_url"]
+        if not download_url and self.conf["download_repository"]:
+            try:
+                download_url = get_largest_package_url(
+                    self.conf["download_repository"]
+                )
+            except (OSError, ValueError) as e:
+                self.results["download"] = {"error": str(e)}
+        if download_url:
+            self.results["download"] = measure_download(
+                download_url,
+                self.conf["download_max_bytes"],
+                self.conf["download_max_seconds"],
+            )
+
+    def get_issues(self):
+        issues = []
+        max_rtt_ms = self.conf["max_rtt_ms"]
+        for endpoint, result in self.results.get("endpoints", {}).items():
+            if "error" in result:
+                issues.append(f"'{endpoint}' unreachable: {result['error']}")
+            elif max_rtt_ms and result["rtt_ms"] > max_rtt_ms:
+                issues.append(
+                    f"'{endpoint}' latency {result['rtt_ms']:.0f} ms "
+                    f"above {max_rtt_ms} ms"
+                )
+        download = self.results.get("download", None)
+        min_download_mbps = self.conf["min_download_mbps"]
+        if download and "error" in download:
+            issues.append(f"Download failed: {download['error']}")
+        elif (
+            download
+            and min_download_mbps
+            and download["mbps"] < min_download_mbps
+        ):
+            issues.append(
+                f"Download throughput {download['mbps']:.1f} Mbit/s "
+                f"below {min_download_mbps} Mbit/s"
+            )
+        return issues
+
+
 def get_random_string(length):
     misleading_characters = "0Ool1"
     standard_characters = string.ascii_letters + string.digits
@@ -327,8 +1182,10 @@ def is_mount_needed(directory, expected_device_path):
         raise WizardError(str(e)) from e
 
 
-def select_compatible_gpus(allow_pci_bridge=True, insecure=False):
-    parser = PCIParser()
+def select_compatible_gpus(
+    allow_pci_bridge=True, insecure=False, parser=None
+):
+    parser = parser or PCIParser()
     gpu_devices = parser.get_devices(class_code=PCI_VGA_CLASS_ID, vendor="10de")
 
     gpus = {}
@@ -339,7 +1196,7 @@ def select_compatible_gpus(allow_pci_bridge=True, insecure=False):
             device, relax=allow_pci_bridge, insecure=insecure
         ):
             bad_isolation_groups.append(
-                (device, parser.iommu_groups[device.iommu_group])
+                (device, parser.get_group(device.iommu_group))
             )
             continue
         vfio_devices = [device.slot for device in [device] + device.consumers]
@@ -405,13 +1262,192 @@ def get_filtered_blkid_output():
     return filtered_devices
 
 
-def get_partition_description(device):
+def get_partition_description(device, benchmark=None, rank=None):
     description = f"UUID={device['UUID']}"
     if device["_label"]:
         description = f"{description} LABEL={device['_label']}"
+    if benchmark and benchmark.get("rand_read_latency_ms", None):
+        write_latency = benchmark.get("rand_write_latency_ms", None)
+        description = (
+            f"{description} [{benchmark['seq_read_mbps']:.0f} MB/s, "
+            f"{benchmark['rand_read_latency_ms']:.2f} ms, "
+            f"{f'{write_latency:.2f} ms' if write_latency else '-'}]"
+        )
+    if rank:
+        description = f"{description} #{rank}"
     return description
 
 
+def get_mount_point(devname):
+    device_id = os.stat(devname).st_rdev
+    with open("/proc/mounts", "r") as mounts_file:
+        for line in mounts_file:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].startswith("/dev/"):
+                try:
+                    if os.stat(parts[1]).st_dev == device_id:
+                        return parts[1]
+                except OSError:
+                    continue
+    return None
+
+
+def _measure_random_io(io_func, size, deadline):
+    latencies = []
+    block_count = size // mmap.PAGESIZE
+    if not block_count:
+        return None
+    while (
+        len(latencies) < STORAGE_BENCH_RANDOM_OPS_MAX
+        and time.monotonic() < deadline
+    ):
+        offset = random.randrange(block_count) * mmap.PAGESIZE
+        start = time.perf_counter()
+        io_func(offset)
+        latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies) * 1000 if latencies else None
+
+
+def benchmark_partition(devname, time_budget=STORAGE_BENCH_TIME_BUDGET):
+    """
+    Measure a partition without modifying its content: sequential and
+    random reads are done on the block device, random writes only in a
+    temporary file when the partition filesystem is mounted.
+    """
+    result = {}
+    start = time.monotonic()
+    fd = os.open(devname, os.O_RDONLY | os.O_DIRECT)
+    try:
+        size = os.lseek(fd, 0, os.SEEK_END)
+
+        # O_DIRECT needs aligned buffers which anonymous mmaps are
+        seq_buffer = mmap.mmap(-1, 1024 * 1024)
+        deadline = start + time_budget / 2
+        read_bytes = 0
+        seq_start = time.perf_counter()
+        while (
+            read_bytes < min(size, STORAGE_BENCH_SEQ_READ_MAX)
+            and time.monotonic() < deadline
+        ):
+            count = os.preadv(fd, [seq_buffer], read_bytes)
+            if not count:
+                break
+            read_bytes += count
+        result["seq_read_mbps"] = (
+            read_bytes / (time.perf_counter() - seq_start) / 1e6
+        )
+
+        random_buffer = mmap.mmap(-1, mmap.PAGESIZE)
+        result["rand_read_latency_ms"] = _measure_random_io(
+            lambda offset: os.preadv(fd, [random_buffer], offset),
+            size,
+            start + time_budget * 3 / 4,
+        )
+    finally:
+        os.close(fd)
+
+    mount_point = get_mount_point(devname)
+    if mount_point:
+        # Read-only or full filesystem: keep the read results
+        try:
+            with tempfile.NamedTemporaryFile(
+                dir=mount_point, prefix=".golemwz-bench-"
+            ) as bench_file:
+                os.posix_fallocate(
+                    bench_file.fileno(), 0, STORAGE_BENCH_WRITE_FILE_SIZE
+                )
+                block = os.urandom(mmap.PAGESIZE)
+
+                def write_block(offset):
+                    os.pwrite(bench_file.fileno(), block, offset)
+                    os.fdatasync(bench_file.fileno())
+
+                result["rand_write_latency_ms"] = _measure_random_io(
+                    write_block,
+                    STORAGE_BENCH_WRITE_FILE_SIZE,
+                    start + time_budget,
+                )
+        except OSError as e:
+            logger.warning(
+                f"Cannot measure writes on '{devname}' ({mount_point}): "
+                f"{str(e)}"
+            )
+    return result
+
+
+def get_device_serial(devname):
+    try:
+        output = subprocess.check_output(
+            ["udevadm", "info", "--query=property", f"--name={devname}"],
+            text=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    properties = dict(
+        line.split("=", 1) for line in output.splitlines() if "=" in line
+    )
+    return properties.get("ID_SERIAL", None)
+
+
+def run_partition_benchmark(devname, time_budget=STORAGE_BENCH_TIME_BUDGET):
+    # Raw block devices are only readable by root
+    bench_cmd = [
+        "sudo",
+        sys.executable,
+        str(Path(__file__).resolve()),
+        "storage-bench",
+        devname,
+        "--time-budget",
+        str(time_budget),
+    ]
+    try:
+        result = subprocess.run(
+            bench_cmd,
+            capture_output=True,
+            text=True,
+            check=True,
+            timeout=time_budget * 2 + 5,
+        )
+        return json.loads(result.stdout)
+    except (
+        subprocess.CalledProcessError,
+        subprocess.TimeoutExpired,
+        json.JSONDecodeError,
+    ) as e:
+        logger.warning(f"Failed to measure storage '{devname}': {str(e)}")
+        return None
+
+
+def benchmark_partitions(devices, cache):
+    """
+    Measure every partition in parallel, once per disk. Results are stored
+    in the 'cache' dict by device serial and reused for the other
+    partitions of the same disk.
+    """
+    serials = {
+        devname: get_device_serial(devname) or devname for devname in devices
+    }
+    to_measure = {}
+    for devname, serial in serials.items():
+        if serial not in cache and serial not in to_measure:
+            to_measure[serial] = devname
+
+    if to_measure:
+        with ThreadPoolExecutor(max_workers=len(to_measure)) as executor:
+            results = executor.map(
+                run_partition_benchmark, to_measure.values()
+            )
+            for serial, result in zip(to_measure, results):
+                if result:
+                    cache[serial] = result
+
+    return {
+        devname: cache[serial]
+        for devname, serial in serials.items()
+        if serial in cache
+    }
+
+
 def fix_paths(runtime_files_dir):
     for runtime_json in glob.glob(str(runtime_files_dir) + "/ya-*.json"):
         runtime_json_path = Path(runtime_json).resolve()
@@ -432,10 +1468,23 @@ def fix_paths(runtime_files_dir):
 def mount_conf_storage():
     dev_partlabel = "/dev/disk/by-partlabel/Golem\\x20conf\\x20storage"
 
+    if not Path(dev_partlabel).exists():
+        # e.g. booted from the ISO image, configuration is lost on reboot
+        logger.warning("No configuration partition found.")
+        return
+
     if not is_mount_needed("/mnt", dev_partlabel):
         return
 
-    mount_cmd = ["sudo", "mount", dev_partlabel, "/mnt"]
+    # Only readable by the wizard user, it holds the password hash
+    mount_cmd = [
+        "sudo",
+        "mount",
+        "-o",
+        f"uid={os.getuid()},gid={os.getgid()},fmask=0177,dmask=0077",
+        dev_partlabel,
+        "/mnt",
+    ]
     try:
         subprocess.run(mount_cmd, check=True)
     except subprocess.CalledProcessError as e:
@@ -480,32 +1529,259 @@ def configure_storage(device, resize_partition):
     subprocess.run(mount_cmd, check=True)
 
 
-def configure_bind_mount(directory, bind_directory):
-    if os.path.ismount(bind_directory):
-        return True
+def _has_mounted_device(block_device):
+    return bool(block_device.get("mountpoint", None)) or any(
+        _has_mounted_device(child)
+        for child in block_device.get("children", [])
+    )
 
-    mkdir_cmd = ["sudo", "mkdir", "-p", str(directory), str(bind_directory)]
-    subprocess.run(mkdir_cmd)
 
-    permissions_cmd = [
-        "sudo",
-        "chown",
-        "-R",
-        "golem:golem",
-        str(directory),
-        str(bind_directory),
-    ]
-    subprocess.run(permissions_cmd, check=True)
+def get_stripe_candidates():
+    """
+    Return whole disks and partitions not in use which can be assembled
+    into a striped volume. The live disk only provides 'Golem storage'.
+    """
+    lsblk_output = subprocess.check_output(
+        [
+            "lsblk",
+            "--json",
+            "--bytes",
+            "--paths",
+            "--output",
+            "NAME,TYPE,SIZE,MOUNTPOINT,MODEL,PARTLABEL",
+        ]
+    )
+    candidates = {}
+    for disk in json.loads(lsblk_output)["blockdevices"]:
+        if disk["type"] != "disk":
+            continue
+        partitions = disk.get("children", [])
+        if not partitions:
+            if not disk.get("mountpoint", None):
+                candidates[disk["name"]] = disk
+            continue
+        disk_in_use = _has_mounted_device(disk)
+        for partition in partitions:
+            if _has_mounted_device(partition) or partition.get("children"):
+                continue
+            if disk_in_use and partition["partlabel"] != "Golem storage":
+                continue
+            partition["model"] = disk.get("model", None)
+            candidates[partition["name"]] = partition
+    return candidates
 
-    mount_cmd = [
-        "sudo",
-        "mount",
-        "-o",
-        "bind",
-        str(directory),
-        str(bind_directory),
-    ]
-    subprocess.run(mount_cmd, check=True)
+
+def get_stripe_description(block_device):
+    description = f"{int(block_device['size']) // 1024**3} GiB"
+    for key in ("model", "partlabel"):
+        if block_device.get(key, None):
+            description = f"{description} {block_device[key].strip()}"
+    return description
+
+
+def create_striped_storage(devnames):
+    """
+    Assemble a RAID0 volume of the given devices and format it. Any data on
+    them is lost.
+    """
+    stride = STRIPE_CHUNK_KIB // 4
+    disk_operations = [
+        f"mdadm --create {STRIPE_MD_DEVICE} --run --level=0 "
+        f"--chunk={STRIPE_CHUNK_KIB} --metadata=1.2 --name=golem-storage "
+        f"--homehost=any --raid-devices={len(devnames)} "
+        + " ".join(devnames),
+        "udevadm settle",
+        f"mkfs.ext4 -q -F -L 'Golem striped storage' "
+        f"-E stride={stride},stripe_width={stride * len(devnames)} "
+        f"{STRIPE_MD_DEVICE}",
+        "udevadm settle",
+    ]
+    subprocess.run(
+        ["sudo", "bash", "-c", "&&".join(disk_operations)], check=True
+    )
+
+    md_detail = subprocess.check_output(
+        ["sudo", "mdadm", "--detail", "--export", STRIPE_MD_DEVICE], text=True
+    )
+    md_properties = dict(
+        line.split("=", 1) for line in md_detail.splitlines() if "=" in line
+    )
+    return {
+        "name": "golem-storage",
+        "uuid": md_properties["MD_UUID"],
+        "members": list(devnames),
+    }
+
+
+def assemble_striped_storage(stripe):
+    if Path(STRIPE_MD_DEVICE).exists():
+        return
+
+    assemble_cmd = [
+        "sudo",
+        "mdadm",
+        "--assemble",
+        STRIPE_MD_DEVICE,
+        "--scan",
+        f"--uuid={stripe['uuid']}",
+    ]
+    try:
+        subprocess.run(assemble_cmd, check=True)
+        subprocess.run(["sudo", "udevadm", "settle"], check=True)
+    except subprocess.CalledProcessError as e:
+        raise WizardError(f"Failed to assemble striped storage: {str(e)}")
+
+
+def get_scratch_size(mem_total, gpu_count):
+    return (
+        mem_total
+        - SCRATCH_HOST_RESERVED_MEMORY
+        - gpu_count * SCRATCH_VM_MEMORY_PER_GPU
+    )
+
+
+def configure_scratch_storage(kind, size):
+    mount_point = Path("~").expanduser() / "mnt"
+
+    if os.path.ismount(mount_point):
+        return
+
+    mount_point.mkdir(exist_ok=True)
+
+    if kind == "tmpfs":
+        mount_cmd = [
+            "sudo",
+            "mount",
+            "-t",
+            "tmpfs",
+            "-o",
+            f"size={size},mode=0755",
+            "tmpfs",
+            str(mount_point),
+        ]
+        subprocess.run(mount_cmd, check=True)
+    elif kind == "zram":
+        subprocess.run(["sudo", "modprobe", "zram"], check=True)
+        # Size is uncompressed data, memory used is capped by 'mem_limit'
+        zram_device = subprocess.run(
+            [
+                "sudo",
+                "zramctl",
+                "--find",
+                "--algorithm",
+                "zstd",
+                "--size",
+                str(size * SCRATCH_ZRAM_RATIO),
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        disk_operations = [
+            f"echo {size} > /sys/block/{Path(zram_device).name}/mem_limit",
+            f"mkfs.ext4 -q -m 0 -O ^has_journal {zram_device}",
+            f"mount -o discard,noatime {zram_device} {mount_point}",
+        ]
+        subprocess.run(
+            ["sudo", "bash", "-c", "&&".join(disk_operations)], check=True
+        )
+    else:
+        raise WizardError(f"Unknown scratch storage '{kind}'.")
+
+
+def parse_cpu_list(cpu_list):
+    count = 0
+    for cpu_range in cpu_list.strip().split(","):
+        if cpu_range:
+            first, _, last = cpu_range.partition("-")
+            count += int(last or first) - int(first) + 1
+    return count
+
+
+def get_host_capacity(storage_path, sysfs_root="/sys", proc_root="/proc"):
+    meminfo = read_meminfo(proc_root)
+    try:
+        stat = os.statvfs(storage_path)
+        storage_size = stat.f_blocks * stat.f_frsize
+    except OSError:
+        storage_size = 0
+    return {
+        "cpus": parse_cpu_list(
+            read_sysfs(Path(sysfs_root) / "devices/system/cpu/online", "0")
+        ),
+        "memory": meminfo["MemTotal"],
+        # Reserved hugepages can't be used by the runtime
+        "hugepages": meminfo.get("HugePages_Total", 0)
+        * meminfo.get("Hugepagesize", 0),
+        "storage_size": storage_size,
+    }
+
+
+def derive_resource_limits(capacity, gpu_count, reserved_memory=0):
+    """
+    Resources offered to GPU tasks, what is left once the host, GPU VM
+    overhead and 'reserved_memory' (e.g. scratch storage) are accounted
+    for. Disk is derived from storage size rather than free space so that
+    limits don't change as provider data grows.
+    """
+    memory = (
+        capacity["memory"]
+        - capacity["hugepages"]
+        - reserved_memory
+        - RESOURCES_HOST_MEMORY
+        - gpu_count * RESOURCES_HOST_MEMORY_PER_GPU
+    )
+    disk = capacity["storage_size"] * (1 - RESOURCES_HOST_DISK_RATIO)
+    return {
+        "cores": max(1, capacity["cpus"] - RESOURCES_HOST_CORES),
+        "memory_gib": max(1, int(memory // 1024**3)),
+        "disk_gib": max(1, int(disk // 1024**3)),
+    }
+
+
+def configure_resources(limits, env=None):
+    golemsp_set_resources_cmd = [
+        "golemsp",
+        "settings",
+        "set",
+        "--cores",
+        str(limits["cores"]),
+        "--memory",
+        f"{limits['memory_gib']}GiB",
+        "--disk",
+        f"{limits['disk_gib']}GiB",
+    ]
+    subprocess.run(
+        golemsp_set_resources_cmd, check=True, env=env or get_env()
+    )
+
+
+def configure_bind_mount(directory, bind_directory):
+    if os.path.ismount(bind_directory):
+        return True
+
+    mkdir_cmd = ["sudo", "mkdir", "-p", str(directory), str(bind_directory)]
+    subprocess.run(mkdir_cmd)
+
+    permissions_cmd = [
+        "sudo",
+        "chown",
+        "-R",
+        "golem:golem",
+        str(directory),
+        str(bind_directory),
+    ]
+    subprocess.run(permissions_cmd, check=True)
+
+    mount_cmd = [
+        "sudo",
+        "mount",
+        "-o",
+        "bind",
+        str(directory),
+        str(bind_directory),
+    ]
+    subprocess.run(mount_cmd, check=True)
 
 
 def get_env():
@@ -534,123 +1810,1532 @@ def preset_exists(runtime_id):
     return provider_entry_exists("preset", runtime_id)
 
 
-def configure_runtime(runtime_path, selected_gpus):
-    runtime_content = json.loads(runtime_path.read_text())
+def get_runtime_path():
+    return (
+        (
+            Path("~").expanduser()
+            / ".local/lib/yagna/plugins/ya-runtime-vm-nvidia.json"
+        )
+        .expanduser()
+        .resolve()
+    )
+
+
+def get_runtime_plugins_digest(plugins_dir="/usr/lib/yagna/plugins"):
+    # Runtime descriptors shipped with the image, changed by upgrades
+    digest = hashlib.sha256()
+    for runtime_json in sorted(Path(plugins_dir).glob("ya-*.json")):
+        digest.update(runtime_json.name.encode())
+        digest.update(runtime_json.read_bytes())
+    return digest.hexdigest()
+
+
+def configure_runtime(runtime_path, selected_gpus):
+    runtime_content = json.loads(runtime_path.read_text())
+
+    runtime_gpu_args = [
+        f"--runtime-arg=--pci-device={gpu['slot']}" for gpu in selected_gpus
+    ]
+
+    # Replace GPUs previously configured
+    runtime_content[0]["extra-args"] = [
+        arg
+        for arg in runtime_content[0].get("extra-args", [])
+        if not arg.startswith("--runtime-arg=--pci-device=")
+    ]
+    runtime_content[0]["extra-args"] += runtime_gpu_args
+
+    # Ensure there is no duplicate args
+    runtime_content[0]["extra-args"] = list(
+        set(runtime_content[0]["extra-args"])
+    )
+
+    runtime_path.write_text(json.dumps(runtime_content, indent=4))
+
+
+def configure_preset(
+    runtime_id, account, duration_price, cpu_price, node_name=None
+):
+    env = get_env()
+
+    if not account:
+        raise WizardError(
+            "Wallet account address must be provided to set up the preset!"
+        )
+
+    # FIXME: golemsp passing args is not working at the time of writing
+    env["YA_ACCOUNT"] = account
+
+    golemsp_setup_cmd = [
+        "golemsp",
+        "setup",
+        "--no-interactive",
+        "--account",
+        account,
+    ]
+    subprocess.run(golemsp_setup_cmd, check=True, env=env)
+
+    pre_install_cmd = ["ya-provider", "pre-install"]
+    subprocess.run(pre_install_cmd, check=True, env=env)
+
+    golemsp_manifest_bundle_cmd = [
+        "golemsp",
+        "manifest-bundle",
+        "add",
+        "/usr/lib/yagna/installer",
+    ]
+    subprocess.run(golemsp_manifest_bundle_cmd, check=True, env=env)
+
+    # Set node name if provided
+    if node_name:
+        configure_node_name(node_name, env)
+
+    configure_pricing(runtime_id, duration_price, cpu_price, env)
+
+
+def configure_node_name(node_name, env=None):
+    golemsp_set_node_name_cmd = [
+        "golemsp",
+        "settings",
+        "set",
+        "--node-name",
+        node_name,
+    ]
+    subprocess.run(
+        golemsp_set_node_name_cmd, check=True, env=env or get_env()
+    )
+
+
+def configure_pricing(runtime_id, duration_price, cpu_price, env=None):
+    env = env or get_env()
+    pricing_cmd = [
+        "--pricing",
+        "linear",
+        "--price",
+        f"Duration={duration_price}",
+        f"CPU={cpu_price}",
+    ]
+    preset_cmd = ["ya-provider", "preset"]
+    if preset_exists(runtime_id):
+        preset_cmd += ["update", "--name", runtime_id]
+    else:
+        preset_cmd += ["create", "--preset-name", runtime_id]
+    preset_cmd += ["--no-interactive", "--exe-unit", runtime_id] + pricing_cmd
+    subprocess.run(preset_cmd, check=True, env=env)
+
+    activate_cmd = ["ya-provider", "preset", "activate", runtime_id]
+    subprocess.run(activate_cmd, check=True, env=env)
+
+
+def bind_vfio(slots, topology=None):
+    def get_driver(slot):
+        # A live topology knows the drivers without reading sysfs
+        if topology:
+            return topology.get_driver(slot)
+        return _get_driver(Path("/sys/bus/pci/devices") / slot)
+
+    # Release the consoles and the boot framebuffer, also when the devices
+    # were claimed early: they may still use the memory of the boot GPU
+    cmds = []
+    if Path("/sys/class/vtconsole/vtcon0/bind").exists():
+        cmds += ["echo 0 > /sys/class/vtconsole/vtcon0/bind"]
+    if Path("/sys/class/vtconsole/vtcon1/bind").exists():
+        cmds += ["echo 0 > /sys/class/vtconsole/vtcon1/bind"]
+    if Path(
+        "/sys/bus/platform/drivers/efi-framebuffer/efi-framebuffer.0"
+    ).exists():
+        cmds += [
+            "echo efi-framebuffer.0 > /sys/bus/platform/drivers/efi-framebuffer/unbind"
+        ]
+
+    if all(get_driver(slot) == "vfio-pci" for slot in slots):
+        # Already claimed, e.g. from initramfs with 'golemwz.vfio='
+        logger.info("Devices already bound to vfio-pci.")
+    else:
+        for slot in set(slots):
+            driver_override_path = (
+                f"/sys/bus/pci/devices/{slot}/driver_override"
+            )
+            bind_path = "/sys/bus/pci/drivers/vfio-pci/bind"
+
+            driver = get_driver(slot)
+            if driver == "vfio-pci":
+                continue
+            if driver:
+                cmds += [
+                    f'echo "{slot}" > /sys/bus/pci/drivers/{driver}/unbind'
+                ]
+
+            cmds += [
+                f'echo vfio-pci > "{driver_override_path}"',
+                f'echo "{slot}" > "{bind_path}"',
+            ]
+        cmds += ["modprobe -i vfio-pci"]
+    for cmd in cmds:
+        logger.debug(f"Running '{cmd}'")
+        subprocess.run(
+            ["sudo", "bash", "-c", cmd],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+
+def get_kernel_profile_inputs(
+    selected_gpus, sysfs_root="/sys", proc_root="/proc"
+):
+    cpu_vendor = None
+    for line in (Path(proc_root) / "cpuinfo").read_text().splitlines():
+        if line.startswith("vendor_id"):
+            cpu_vendor = line.split(":", 1)[1].strip()
+            break
+
+    vga_devices = {}
+    for device_path in sorted(Path(sysfs_root).glob("bus/pci/devices/*")):
+        if read_sysfs(device_path / "class", "").startswith("0x0300"):
+            vga_devices[device_path.name] = (
+                read_sysfs(device_path / "boot_vga") == "1"
+            )
+
+    # Legacy serial ports are always listed, type 0 means no UART behind
+    serial_consoles = [
+        type_path.parent.name
+        for type_path in sorted(Path(sysfs_root).glob("class/tty/ttyS*/type"))
+        if read_sysfs(type_path, "0") != "0"
+    ]
+
+    passthrough_slots = []
+    for gpu in selected_gpus:
+        passthrough_slots += gpu["vfio_devices"]
+
+    return {
+        "cpu_vendor": cpu_vendor,
+        "vga_devices": vga_devices,
+        "serial_consoles": serial_consoles,
+        "passthrough_slots": sorted(passthrough_slots),
+    }
+
+
+def derive_kernel_profile(inputs, early_vfio=False):
+    if inputs["cpu_vendor"] == "GenuineIntel":
+        profile = ["intel_iommu=on"]
+    elif inputs["cpu_vendor"] == "AuthenticAMD":
+        profile = ["amd_iommu=on"]
+    else:
+        profile = ["intel_iommu=on", "amd_iommu=on"]
+
+    # Only passthrough devices need DMA remapping, host ones skip translation
+    profile.append("iommu=pt")
+
+    passthrough_slots = set(inputs["passthrough_slots"])
+    host_vga_devices = [
+        slot
+        for slot in inputs["vga_devices"]
+        if slot not in passthrough_slots
+    ]
+    if host_vga_devices and any(
+        boot_vga
+        for slot, boot_vga in inputs["vga_devices"].items()
+        if slot in passthrough_slots
+    ):
+        # Don't let the firmware framebuffer hold a passthrough GPU. With a
+        # single GPU, it is the only console until the wizard releases it
+        profile.append("video=efifb:off")
+
+    if host_vga_devices:
+        # Keep VGA arbitration for the host console GPU
+        profile += ["vfio-pci.disable_vga=1", "console=tty0"]
+    elif inputs["serial_consoles"]:
+        profile += [
+            f"console={inputs['serial_consoles'][0]},115200n8",
+            "console=tty0",
+        ]
+
+    if early_vfio and passthrough_slots:
+        # Claimed for vfio-pci by initramfs before any host driver
+        profile.append(f"golemwz.vfio={','.join(sorted(passthrough_slots))}")
+
+    digest = hashlib.sha256(" ".join(profile).encode()).hexdigest()[:12]
+    profile.append(f"golemwz.profile={digest}")
+    return profile
+
+
+def validate_kernel_profile(profile):
+    for parameter in profile:
+        if not re.match(r"^[a-z0-9_.-]+=[A-Za-z0-9_.,:-]+$", parameter):
+            raise WizardError(f"Invalid kernel parameter '{parameter}'.")
+        if parameter.split("=", 1)[0] not in KERNEL_PROFILE_PARAMETERS:
+            raise WizardError(f"Unsupported kernel parameter '{parameter}'.")
+
+
+def get_kernel_profile_state():
+    try:
+        output = subprocess.check_output(
+            ["grub-editenv", str(KERNEL_PROFILE_GRUBENV_PATH), "list"],
+            text=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    for line in output.splitlines():
+        if line.startswith("golem_profile_state="):
+            return line.split("=", 1)[1]
+    return None
+
+
+def set_kernel_profile_state(state):
+    subprocess.run(
+        [
+            "sudo",
+            "grub-editenv",
+            str(KERNEL_PROFILE_GRUBENV_PATH),
+            "set",
+            f"golem_profile_state={state}",
+        ],
+        check=True,
+    )
+
+
+def write_kernel_profile(profile):
+    """
+    GRUB boots a new profile once ('pending' then 'trial'), falling back to
+    default kernel parameters unless the wizard confirmed the boot.
+    """
+    write_file(
+        KERNEL_PROFILE_PATH,
+        "# Generated by golemwz\n"
+        f'set golem_cmdline="{" ".join(profile)}"\n'
+        "export golem_cmdline\n",
+    )
+    set_kernel_profile_state("pending")
+
+
+def confirm_kernel_profile_boot():
+    cmdline = Path("/proc/cmdline").read_text().split()
+    if any(x.startswith("golemwz.profile=") for x in cmdline):
+        if get_kernel_profile_state() == "trial":
+            logger.info("Boot with kernel profile succeeded.")
+            set_kernel_profile_state("good")
+
+
+def _get_driver(device_path):
+    try:
+        return os.path.basename(os.readlink(device_path / "driver"))
+    except OSError:
+        return None
+
+
+def _get_iommu_group(device_path):
+    try:
+        return int(os.path.basename(os.readlink(device_path / "iommu_group")))
+    except (OSError, ValueError):
+        return None
+
+
+def probe_vfio_readiness(gpu, sysfs_root="/sys", dev_root="/dev"):
+    """
+    Check that a GPU bound to vfio-pci can actually be handed to a VM: all
+    its IOMMU group members are released by host drivers, the group device
+    opens and is viable, and the GPU can be reset.
+    """
+    devices_path = Path(sysfs_root) / "bus/pci/devices"
+    readiness = {"slot": gpu["slot"], "problems": []}
+    problems = readiness["problems"]
+
+    try:
+        group = os.path.basename(
+            os.readlink(devices_path / gpu["slot"] / "iommu_group")
+        )
+    except OSError:
+        problems.append("No IOMMU group.")
+        readiness["ready"] = False
+        return readiness
+    readiness["iommu_group"] = int(group)
+
+    group_devices_path = Path(sysfs_root) / "kernel/iommu_groups" / group
+    for member in sorted(os.listdir(group_devices_path / "devices")):
+        driver = _get_driver(devices_path / member)
+        if member in gpu["vfio_devices"] and driver != "vfio-pci":
+            problems.append(f"'{member}' is not bound to vfio-pci.")
+        elif driver not in VFIO_VIABLE_DRIVERS:
+            problems.append(f"'{member}' is bound to host driver '{driver}'.")
+
+    # 'reset_method' lists available methods, older kernels only have 'reset'
+    reset_method = read_sysfs(devices_path / gpu["slot"] / "reset_method")
+    has_reset = (devices_path / gpu["slot"] / "reset").exists()
+    if reset_method is None and has_reset:
+        reset_method = "unknown"
+    readiness["reset_method"] = reset_method or ""
+    if not reset_method:
+        problems.append("No reset method available.")
+
+    group_dev_path = Path(dev_root) / "vfio" / group
+    try:
+        fd = os.open(group_dev_path, os.O_RDWR)
+    except OSError as e:
+        # Already opened by a running VM
+        if e.errno != errno.EBUSY:
+            problems.append(f"Cannot open '{group_dev_path}': {e.strerror}.")
+    else:
+        try:
+            # struct vfio_group_status { __u32 argsz; __u32 flags; }
+            status = bytearray((8).to_bytes(4, "little") + bytes(4))
+            fcntl.ioctl(fd, VFIO_GROUP_GET_STATUS, status)
+            flags = int.from_bytes(status[4:], "little")
+            if not flags & VFIO_GROUP_FLAGS_VIABLE:
+                problems.append("IOMMU group is not viable.")
+        except OSError as e:
+            # Not a VFIO group device, rely on group members drivers
+            if e.errno != errno.ENOTTY:
+                problems.append(
+                    f"Cannot get IOMMU group status: {e.strerror}."
+                )
+        finally:
+            os.close(fd)
+
+    readiness["ready"] = not problems
+    return readiness
+
+
+def get_provider_activity(proc_root="/proc"):
+    activity = []
+    for comm_path in Path(proc_root).glob("[0-9]*/comm"):
+        comm = read_sysfs(comm_path, "")
+        if any(comm.startswith(x) for x in PROVIDER_ACTIVITY_COMMANDS):
+            activity.append(f"{comm}[{comm_path.parent.name}]")
+    return sorted(activity)
+
+
+def upgrade_gate(state_path, max_deferral, proc_root="/proc"):
+    """
+    Defer upgrades while a task runs, at most 'max_deferral' hours since
+    the first deferral.
+    """
+    try:
+        state = json.loads(state_path.read_text())
+    except (OSError, json.JSONDecodeError):
+        state = {}
+
+    activity = get_provider_activity(proc_root)
+    allowed = True
+    if activity:
+        deferred_since = state.setdefault("deferred_since", time.time())
+        deferred_hours = (time.time() - deferred_since) / 3600
+        if deferred_hours < max_deferral:
+            logger.info(
+                f"Deferring upgrades for {deferred_hours:.1f}h, provider is "
+                f"busy: {', '.join(activity)}"
+            )
+            allowed = False
+        else:
+            logger.warning(
+                f"Upgrades deferred for {deferred_hours:.1f}h, running them "
+                "although provider is busy."
+            )
+    else:
+        logger.info("Provider is idle, upgrades allowed.")
+
+    if allowed:
+        state.pop("deferred_since", None)
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    state_path.write_text(json.dumps(state))
+    return allowed
+
+
+def read_journal(cursor=None):
+    journalctl_cmd = ["journalctl", "--no-pager", "-o", "short-iso"]
+    if cursor:
+        journalctl_cmd.append(f"--after-cursor={cursor}")
+    output = subprocess.run(
+        journalctl_cmd + ["--show-cursor"],
+        capture_output=True,
+        check=True,
+    ).stdout
+    entries, _, last_line = output.rstrip(b"\n").rpartition(b"\n")
+    if not last_line.startswith(b"-- cursor: "):
+        return b"", cursor
+    return entries + b"\n", last_line[len(b"-- cursor: ") :].decode()
+
+
+def flush_logs(
+    buffer_dir=LOG_BUFFER_DIR,
+    archive_dir=LOG_ARCHIVE_DIR,
+    max_bytes=LOG_ARCHIVE_MAX_BYTES,
+):
+    """
+    Write journal entries and buffered log lines added since the last
+    flush as zstd compressed chunks, then remove the oldest chunks above
+    'max_bytes'. Positions are saved once chunks are written so that an
+    interrupted flush is retried rather than lost.
+
+    Buffered logs include the yagna and provider logs, rotated by those
+    services: positions follow files by inode across renames and rotated
+    files are removed from RAM once archived.
+    """
+    state_path = buffer_dir / "log-flush.json"
+    try:
+        state = json.loads(state_path.read_text())
+    except (OSError, json.JSONDecodeError):
+        state = {}
+
+    chunks = {}
+    chunks["journal"], state["journal_cursor"] = read_journal(
+        state.get("journal_cursor", None)
+    )
+    offsets = {}
+    rotated_paths = []
+    for log_path in sorted(buffer_dir.rglob("*.log")):
+        with open(log_path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            offset = state.get("offsets", {}).get(str(stat.st_ino), 0)
+            if offset > stat.st_size:
+                # Truncated since last flush
+                offset = 0
+            f.seek(offset)
+            chunks[log_path.stem] = f.read()
+            offsets[str(stat.st_ino)] = offset + len(chunks[log_path.stem])
+        if log_path.parent != buffer_dir and not log_path.stem.endswith(
+            "_rCURRENT"
+        ):
+            # Rotated by yagna or the provider, not written anymore
+            rotated_paths.append(log_path)
+    state["offsets"] = offsets
+
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    timestamp = time.strftime("%Y%m%dT%H%M%S")
+    for name, data in chunks.items():
+        if not data:
+            continue
+        compressed = subprocess.run(
+            ["zstd", "-q", "-c"], input=data, capture_output=True, check=True
+        ).stdout
+        tmp_path = archive_dir / f".{name}.log.zst.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(compressed)
+            f.flush()
+            os.fsync(f.fileno())
+        # Never overwrite a chunk, e.g. of a flush in the same second
+        for counter in itertools.count():
+            chunk_path = archive_dir / f"{name}-{timestamp}-{counter}.log.zst"
+            try:
+                os.link(tmp_path, chunk_path)
+                break
+            except FileExistsError:
+                continue
+        tmp_path.unlink()
+        logger.info(
+            f"Archived {len(data)} bytes of '{name}' logs in {chunk_path} "
+            f"({len(compressed)} bytes)."
+        )
+    state_path.write_text(json.dumps(state))
+    for log_path in rotated_paths:
+        log_path.unlink()
+
+    archived = sorted(archive_dir.glob("*.log.zst"), key=os.path.getmtime)
+    total = sum(path.stat().st_size for path in archived)
+    while archived and total > max_bytes:
+        oldest = archived.pop(0)
+        total -= oldest.stat().st_size
+        oldest.unlink()
+
+
+def get_busy_vfio_groups(proc_root="/proc"):
+    busy_groups = set()
+    for fd_path in Path(proc_root).glob("[0-9]*/fd/*"):
+        try:
+            target = os.readlink(fd_path)
+        except OSError:
+            continue
+        group = target[len("/dev/vfio/") :]
+        if target.startswith("/dev/vfio/") and group.isdigit():
+            busy_groups.add(group)
+    return busy_groups
+
+
+class PowerManager:
+    """
+    Let idle passthrough GPUs and their upstream bridges enter runtime
+    suspend, D3cold where the platform supports it.
+
+    A GPU is idle when it is bound to vfio-pci and no process holds its
+    '/dev/vfio' group open, vfio-pci wakes it up when a VM opens it. The
+    wake latency of each GPU is measured once and GPUs waking up slower
+    than the budget are kept awake.
+    """
+
+    def __init__(
+        self,
+        wake_budget_ms=POWER_WAKE_BUDGET_MS,
+        sysfs_root="/sys",
+        proc_root="/proc",
+        state_path=POWER_STATE_PATH,
+    ):
+        self.wake_budget_ms = wake_budget_ms
+        self.sysfs_root = Path(sysfs_root)
+        self.proc_root = Path(proc_root)
+        self.state_path = Path(state_path)
+        # Wake latencies of a previous run, GPUs are not woken up again
+        try:
+            self.state = json.loads(self.state_path.read_text())
+        except (OSError, json.JSONDecodeError):
+            self.state = {}
+        if not isinstance(self.state, dict):
+            self.state = {}
+
+    def _device_path(self, slot):
+        return self.sysfs_root / "bus/pci/devices" / slot
+
+    def _set_control(self, slot, control):
+        control_path = self._device_path(slot) / "power/control"
+        if read_sysfs(control_path) not in (None, control):
+            control_path.write_text(control)
+
+    def get_upstream_bridges(self, slot):
+        return [
+            path.name
+            for path in self._device_path(slot).resolve().parents
+            if re.match(PCI_SLOT_PATTERN, path.name)
+        ]
+
+    def measure_wake_latency(self, slot):
+        power_path = self._device_path(slot) / "power"
+        start = time.perf_counter()
+        # Resumes the device synchronously
+        (power_path / "control").write_text("on")
+        while read_sysfs(power_path / "runtime_status") != "active":
+            if time.perf_counter() - start > POWER_WAKE_TIMEOUT:
+                return None
+            time.sleep(0.001)
+        return round((time.perf_counter() - start) * 1000, 3)
+
+    def update(self, gpus):
+        busy_groups = get_busy_vfio_groups(self.proc_root)
+        for gpu in gpus:
+            slot = gpu["slot"]
+            device_path = self._device_path(slot)
+            state = self.state.setdefault(
+                slot, {"wake_latency_ms": None, "kept_awake": False}
+            )
+            try:
+                group = os.path.basename(
+                    os.readlink(device_path / "iommu_group")
+                )
+            except OSError:
+                group = None
+            bound = all(
+                _get_driver(self._device_path(x)) == "vfio-pci"
+                for x in gpu.get("vfio_devices", [slot])
+            )
+            state["idle"] = bound and group not in busy_groups
+            if not state["idle"] or state["kept_awake"]:
+                continue
+
+            if (
+                state["wake_latency_ms"] is None
+                and read_sysfs(device_path / "power/runtime_status")
+                == "suspended"
+            ):
+                latency = self.measure_wake_latency(slot)
+                state["wake_latency_ms"] = latency
+                if latency is None or latency > self.wake_budget_ms:
+                    logger.warning(
+                        f"GPU '{slot}' wakes up in {latency} ms, above "
+                        f"{self.wake_budget_ms} ms: keeping it awake."
+                    )
+                    state["kept_awake"] = True
+                    continue
+                logger.info(f"GPU '{slot}' wakes up in {latency} ms.")
+
+            for x in gpu.get("vfio_devices", [slot]) + (
+                self.get_upstream_bridges(slot)
+            ):
+                self._set_control(x, "auto")
+                d3cold_path = self._device_path(x) / "d3cold_allowed"
+                if read_sysfs(d3cold_path) == "0":
+                    d3cold_path.write_text("1")
+
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_name(f".{self.state_path.name}.tmp")
+        tmp_path.write_text(json.dumps(self.state))
+        os.replace(tmp_path, self.state_path)
+
+
+def run_power_manager(wizard_conf_path, interval, once=False, **kwargs):
+    power_manager = PowerManager(**kwargs)
+    while True:
+        # Reloaded to follow GPUs changed by the control daemon
+        gpus = load_wizard_conf(wizard_conf_path).get("gpus", [])
+        power_manager.update(gpus)
+        if once:
+            break
+        time.sleep(interval)
+
+
+def load_wizard_conf(conf_path):
+    try:
+        return toml.loads(Path(conf_path).read_text())
+    except FileNotFoundError:
+        return {}
+    except toml.TomlDecodeError as e:
+        raise WizardError(
+            f"Failed to read configuration file '{conf_path}': {str(e)}"
+        )
+
+
+def read_sysfs(path, default=None):
+    try:
+        return Path(path).read_text().strip()
+    except OSError:
+        return default
+
+
+def read_meminfo(proc_root="/proc"):
+    meminfo = {}
+    for line in (Path(proc_root) / "meminfo").read_text().splitlines():
+        key, value = line.split(":", 1)
+        fields = value.split()
+        amount = int(fields[0])
+        if len(fields) > 1 and fields[1] == "kB":
+            amount *= 1024
+        meminfo[key] = amount
+    return meminfo
+
+
+def parse_link_speed(link_speed):
+    # e.g. "16.0 GT/s PCIe" or "Unknown"
+    try:
+        return float(link_speed.split()[0])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def parse_aer_total(aer_content):
+    # AER counters end with a 'TOTAL_ERR_*' line summing all of them
+    for line in (aer_content or "").splitlines():
+        if line.startswith("TOTAL_ERR_"):
+            return int(line.split()[-1])
+    return None
+
+
+class PrometheusMetrics:
+    def __init__(self):
+        self.metrics = {}
+
+    def add(self, name, value, labels=None, kind="gauge", help=""):
+        if value is None:
+            return
+        _, _, samples = self.metrics.setdefault(name, (kind, help, []))
+        samples.append((labels or {}, value))
+
+    @staticmethod
+    def _escape(value):
+        return (
+            str(value)
+            .replace("\\", "\\\\")
+            .replace('"', '\\"')
+            .replace("\n", "\\n")
+        )
+
+    def render(self):
+        lines = []
+        for name, (kind, help, samples) in self.metrics.items():
+            if help:
+                lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if labels:
+                    labels_str = ",".join(
+                        f'{key}="{self._escape(label)}"'
+                        for key, label in labels.items()
+                    )
+                    lines.append(f"{name}{{{labels_str}}} {value}")
+                else:
+                    lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class HostMonitor:
+    """
+    Sample health of the passthrough GPUs and of the host they depend on.
+
+    The PCI topology is resolved once at startup so that every sample only
+    reads a handful of sysfs and procfs files. With a live topology, driver
+    bindings are taken from it instead of sysfs.
+    """
+
+    def __init__(
+        self,
+        gpus,
+        storage_path,
+        sysfs_root="/sys",
+        proc_root="/proc",
+        topology=None,
+        power_state_path=POWER_STATE_PATH,
+    ):
+        self.storage_path = Path(storage_path)
+        self.power_state_path = Path(power_state_path)
+        self.sysfs_root = Path(sysfs_root)
+        self.proc_root = Path(proc_root)
+        self.topology = topology
+
+        parser = topology or PCIParser()
+        devices = {device.slot: device for device in parser.get_devices()}
+
+        self.vfio_slots = []
+        self.pcie_slots = []
+        for gpu in gpus:
+            for slot in gpu.get("vfio_devices", [gpu["slot"]]):
+                self.vfio_slots.append((gpu["slot"], slot))
+            # Upstream bridges carry the link and AER state of the GPU slot
+            device = devices.get(gpu["slot"])
+            related = parser.get_parents(device) + [device] if device else []
+            for related_device in related:
+                self.pcie_slots.append((gpu["slot"], related_device.slot))
+
+        self.metrics = ""
+        self.lock = threading.Lock()
+
+    def _device_path(self, slot):
+        return self.sysfs_root / "bus/pci/devices" / slot
+
+    def collect(self, metrics):
+        for gpu_slot, slot in self.vfio_slots:
+            if self.topology:
+                driver = self.topology.get_driver(slot)
+            else:
+                driver = _get_driver(self._device_path(slot))
+            metrics.add(
+                "golem_gpu_vfio_bound",
+                int(driver == "vfio-pci"),
+                {"gpu": gpu_slot, "slot": slot},
+                help="Whether the device is bound to vfio-pci.",
+            )
+            power_path = self._device_path(slot) / "power"
+            for state in ("active", "suspended"):
+                residency = read_sysfs(power_path / f"runtime_{state}_time")
+                metrics.add(
+                    "golem_gpu_runtime_pm_seconds_total",
+                    int(residency) / 1000 if residency else None,
+                    {"gpu": gpu_slot, "slot": slot, "state": state},
+                    kind="counter",
+                    help="Time spent by the device in each runtime PM state.",
+                )
+
+        try:
+            power_state = json.loads(self.power_state_path.read_text())
+        except (OSError, json.JSONDecodeError):
+            power_state = {}
+        for gpu_slot, gpu_power_state in power_state.items():
+            latency = gpu_power_state.get("wake_latency_ms", None)
+            metrics.add(
+                "golem_gpu_wake_latency_seconds",
+                latency / 1000 if latency is not None else None,
+                {"gpu": gpu_slot},
+                help="Measured runtime resume latency of the GPU.",
+            )
+            metrics.add(
+                "golem_gpu_kept_awake",
+                int(gpu_power_state.get("kept_awake", False)),
+                {"gpu": gpu_slot},
+                help="Whether the GPU is kept awake, waking up too slowly.",
+            )
+
+        for gpu_slot, slot in self.pcie_slots:
+            device_path = self._device_path(slot)
+            labels = {"gpu": gpu_slot, "slot": slot}
+            link = get_link_state(device_path)
+            for state in ("current", "max"):
+                metrics.add(
+                    "golem_pcie_link_speed_gts",
+                    link[f"{state}_speed_gts"],
+                    {**labels, "state": state},
+                    help="PCIe link speed in GT/s.",
+                )
+                metrics.add(
+                    "golem_pcie_link_width",
+                    link[f"{state}_width"],
+                    {**labels, "state": state},
+                    help="PCIe link width in lanes.",
+                )
+            if None not in (link["current_width"], link["max_width"]):
+                metrics.add(
+                    "golem_pcie_link_degraded",
+                    int(is_link_degraded(link)),
+                    labels,
+                    help="Whether the PCIe link is narrower than its "
+                    "capability.",
+                )
+            for severity in ("correctable", "nonfatal", "fatal"):
+                metrics.add(
+                    "golem_pcie_aer_errors_total",
+                    parse_aer_total(
+                        read_sysfs(device_path / f"aer_dev_{severity}")
+                    ),
+                    {**labels, "severity": severity},
+                    kind="counter",
+                    help="PCIe AER errors reported by the device.",
+                )
+
+        meminfo = read_meminfo(self.proc_root)
+        for state, key in (
+            ("total", "MemTotal"),
+            ("available", "MemAvailable"),
+        ):
+            metrics.add(
+                "golem_memory_bytes",
+                meminfo.get(key),
+                {"state": state},
+                help="Host memory.",
+            )
+        for state, key in (
+            ("total", "HugePages_Total"),
+            ("free", "HugePages_Free"),
+        ):
+            metrics.add(
+                "golem_hugepages",
+                meminfo.get(key),
+                {"state": state},
+                help="Host hugepages.",
+            )
+        metrics.add(
+            "golem_hugepage_size_bytes",
+            meminfo.get("Hugepagesize"),
+            help="Size of a host hugepage.",
+        )
+
+        for resource in ("memory", "io"):
+            pressure = read_sysfs(self.proc_root / "pressure" / resource)
+            for line in (pressure or "").splitlines():
+                kind, *fields = line.split()
+                averages = dict(field.split("=", 1) for field in fields)
+                metrics.add(
+                    "golem_pressure_avg10",
+                    averages.get("avg10", None),
+                    {"resource": resource, "kind": kind},
+                    help="Pressure stall over the last 10 seconds.",
+                )
+
+        # Flash wear: bytes written to each physical block device
+        for stat_path in sorted(self.sysfs_root.glob("block/*/stat")):
+            block_device = stat_path.parent.name
+            if block_device.startswith(("loop", "ram", "zram")):
+                continue
+            fields = read_sysfs(stat_path, "").split()
+            if len(fields) > 6:
+                metrics.add(
+                    "golem_block_written_bytes_total",
+                    int(fields[6]) * 512,
+                    {"device": block_device},
+                    kind="counter",
+                    help="Bytes written to the block device.",
+                )
+
+        zram_stats = sorted(self.sysfs_root.glob("block/zram*/mm_stat"))
+        for mm_stat_path in zram_stats:
+            mm_stat = read_sysfs(mm_stat_path, "").split()
+            zram_device = mm_stat_path.parent.name
+            for state, value in zip(
+                ("original", "compressed", "used", "limit"), mm_stat
+            ):
+                metrics.add(
+                    "golem_zram_bytes",
+                    int(value),
+                    {"device": zram_device, "state": state},
+                    help="zram data and memory usage.",
+                )
+
+        try:
+            stat = os.statvfs(self.storage_path)
+            metrics.add(
+                "golem_storage_bytes",
+                stat.f_blocks * stat.f_frsize,
+                {"path": str(self.storage_path), "state": "size"},
+                help="Provider data storage.",
+            )
+            metrics.add(
+                "golem_storage_bytes",
+                stat.f_bavail * stat.f_frsize,
+                {"path": str(self.storage_path), "state": "free"},
+            )
+        except OSError:
+            pass
+
+    def sample(self):
+        start = time.perf_counter()
+        metrics = PrometheusMetrics()
+        self.collect(metrics)
+        metrics.add(
+            "golem_monitor_sample_duration_seconds",
+            round(time.perf_counter() - start, 6),
+            help="Time spent collecting the last sample.",
+        )
+        with self.lock:
+            self.metrics = metrics.render()
+
+    def run(self, server, interval):
+        server.monitor = self
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        while True:
+            self.sample()
+            time.sleep(interval)
+
+
+class MonitorRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        with self.server.monitor.lock:
+            body = self.server.monitor.metrics.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class UnixHTTPServer(
+    socketserver.ThreadingMixIn, socketserver.UnixStreamServer
+):
+    daemon_threads = True
+
+
+def create_monitor_server(listen):
+    if listen.startswith("unix:"):
+        socket_path = Path(listen[len("unix:") :])
+        socket_path.unlink(missing_ok=True)
+        return UnixHTTPServer(str(socket_path), MonitorRequestHandler)
+    host, _, port = listen.rpartition(":")
+    return ThreadingHTTPServer((host, int(port)), MonitorRequestHandler)
+
+
+def create_live_topology():
+    # None when uevents can't be watched, the topology would get stale
+    try:
+        uevent_source = UeventSource()
+    except OSError as e:
+        logger.warning(f"Cannot watch PCI uevents: {str(e)}")
+        return None
+    topology = LiveTopology()
+    topology.listeners.append(
+        lambda action, device: logger.info(
+            f"PCI device '{device.slot}': {action} {device.driver or ''}"
+        )
+    )
+    topology.watch(uevent_source)
+    return topology
+
+
+def run_monitor(wizard_conf_path, listen, interval):
+    topology = create_live_topology()
+
+    gpus = load_wizard_conf(wizard_conf_path).get("gpus", None)
+    if not gpus:
+        # Not configured yet: watch every NVIDIA GPU
+        gpus = list(
+            select_compatible_gpus(insecure=True, parser=topology)[0].values()
+        )
+
+    monitor = HostMonitor(
+        gpus=gpus,
+        storage_path=Path("~").expanduser() / ".local",
+        topology=topology,
+    )
+    logger.info(f"Serving metrics on '{listen}' every {interval}s.")
+    monitor.run(create_monitor_server(listen), interval)
+
 
-    runtime_gpu_args = [
-        f"--runtime-arg=--pci-device={gpu['slot']}" for gpu in selected_gpus
-    ]
+def get_pci_listing_digest(sysfs_root="/sys", **options):
+    # PCI devices and their drivers, changed by hotplug and (un)binding
+    devices_path = Path(sysfs_root) / "bus/pci/devices"
+    listing = []
+    for slot in sorted(os.listdir(devices_path)):
+        listing.append([slot, _get_driver(devices_path / slot)])
+    return hashlib.sha256(
+        json.dumps([INVENTORY_SCHEMA_VERSION, listing, options]).encode()
+    ).hexdigest()
 
-    runtime_content[0].setdefault("extra-args", [])
-    runtime_content[0]["extra-args"] += runtime_gpu_args
 
-    # Ensure there is no duplicate args
-    runtime_content[0]["extra-args"] = list(
-        set(runtime_content[0]["extra-args"])
+def get_gpu_inventory(
+    allow_pci_bridge=True, insecure=False, sysfs_root="/sys", parser=None
+):
+    parser = parser or PCIParser()
+    compatible_gpus, _ = select_compatible_gpus(
+        allow_pci_bridge=allow_pci_bridge, insecure=insecure, parser=parser
     )
+    gpus = []
+    for device in parser.get_devices(
+        class_code=PCI_VGA_CLASS_ID, vendor="10de"
+    ):
+        device_path = Path(sysfs_root) / "bus/pci/devices" / device.slot
+        numa_node = read_sysfs(device_path / "numa_node")
+        gpus.append(
+            {
+                "slot": device.slot,
+                "vendor_id": device.vendor,
+                "device_id": device.device,
+                "description": device.description,
+                "iommu_group": device.iommu_group,
+                "isolated": device.slot in compatible_gpus,
+                "vfio_devices": [device.slot]
+                + [consumer.slot for consumer in device.consumers],
+                "driver": _get_driver(device_path),
+                # -1 without NUMA
+                "numa_node": int(numa_node)
+                if numa_node and numa_node != "-1"
+                else None,
+            }
+        )
+    return sorted(gpus, key=lambda x: x["slot"])
 
-    runtime_path.write_text(json.dumps(runtime_content, indent=4))
 
+def get_link_state(device_path):
+    # Not cached: ASPM lowers the current speed and width of idle links
+    link = {}
+    for state in ("current", "max"):
+        width = read_sysfs(device_path / f"{state}_link_width")
+        link[f"{state}_speed_gts"] = parse_link_speed(
+            read_sysfs(device_path / f"{state}_link_speed")
+        )
+        link[f"{state}_width"] = (
+            int(width) if width and width.isdigit() else None
+        )
+    return link
 
-def configure_preset(
-    runtime_id, account, duration_price, cpu_price, node_name=None
+
+def get_inventory(
+    wizard_conf,
+    allow_pci_bridge=True,
+    insecure=False,
+    cache_path=INVENTORY_CACHE_PATH,
+    sysfs_root="/sys",
+    proc_root="/proc",
 ):
-    env = get_env()
+    """
+    Hardware of the node as a JSON-serializable dict, see README for the
+    schema. The PCI part, which runs lspci, is cached as long as the PCI
+    devices and their drivers don't change.
+    """
+    digest = get_pci_listing_digest(
+        sysfs_root, allow_pci_bridge=allow_pci_bridge, insecure=insecure
+    )
+    try:
+        cache = json.loads(Path(cache_path).read_text())
+    except (OSError, json.JSONDecodeError):
+        cache = {}
+    if cache.get("digest") == digest:
+        gpus = cache["gpus"]
+    else:
+        gpus = get_gpu_inventory(allow_pci_bridge, insecure, sysfs_root)
+        try:
+            Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+            write_file(
+                Path(cache_path), json.dumps({"digest": digest, "gpus": gpus})
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            logger.warning(f"Failed to cache inventory: {str(e)}")
 
-    if not account:
-        raise WizardError(
-            "Wallet account address must be provided to set up the preset!"
+    configured_slots = [gpu["slot"] for gpu in wizard_conf.get("gpus", [])]
+    for gpu in gpus:
+        gpu["link"] = get_link_state(
+            Path(sysfs_root) / "bus/pci/devices" / gpu["slot"]
         )
+        gpu["configured"] = gpu["slot"] in configured_slots
 
-    # FIXME: golemsp passing args is not working at the time of writing
-    env["YA_ACCOUNT"] = account
+    storage_path = Path("~").expanduser() / ".local"
+    capacity = get_host_capacity(storage_path, sysfs_root, proc_root)
+    try:
+        stat = os.statvfs(storage_path)
+        storage_free = stat.f_bavail * stat.f_frsize
+    except OSError:
+        storage_free = 0
+    return {
+        "schema": INVENTORY_SCHEMA_VERSION,
+        "machine_id": get_machine_id(),
+        "hostname": socket.gethostname(),
+        "node_name": wizard_conf.get("glm_node_name", None),
+        "timestamp": int(time.time()),
+        "host": {
+            "cpus": capacity["cpus"],
+            "memory": capacity["memory"],
+            "hugepages": capacity["hugepages"],
+        },
+        "storage": {
+            "partition": wizard_conf.get("storage_partition", None),
+            "stripe": wizard_conf.get("storage_stripe", None),
+            "size": capacity["storage_size"],
+            "free": storage_free,
+        },
+        "gpus": gpus,
+    }
+
+
+def get_machine_id(
+    machine_id_path=MACHINE_ID_PATH, system_machine_id_path="/etc/machine-id"
+):
+    """
+    Identifier of the node which survives reboots: the systemd machine-id of
+    the first boot, saved next to the logs. Every node has the same hostname.
+    """
+    machine_id = read_sysfs(machine_id_path)
+    if machine_id:
+        return machine_id
+    machine_id = read_sysfs(system_machine_id_path) or uuid.uuid4().hex
+    try:
+        Path(machine_id_path).parent.mkdir(parents=True, exist_ok=True)
+        write_file(Path(machine_id_path), machine_id + "\n")
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning(f"Failed to save the machine id: {str(e)}")
+    return machine_id
+
+
+def is_link_degraded(link):
+    # Idle links lower their speed, only a link narrower than the GPU
+    # supports is degraded
+    current_width, max_width = link["current_width"], link["max_width"]
+    return None not in (current_width, max_width) and current_width < max_width
+
+
+def merge_inventories(inventory_paths):
+    """
+    Fleet capacity per GPU model from the inventories of many nodes. Files
+    which can't be read, have another schema or are malformed are skipped.
+    """
+    models = {}
+    for inventory_path in inventory_paths:
+        try:
+            inventory = json.loads(Path(inventory_path).read_text())
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Skipping '{inventory_path}': {str(e)}")
+            continue
+        if not isinstance(inventory, dict):
+            logger.warning(f"Skipping '{inventory_path}': not an inventory.")
+            continue
+        if inventory.get("schema") != INVENTORY_SCHEMA_VERSION:
+            logger.warning(
+                f"Skipping '{inventory_path}': schema "
+                f"{inventory.get('schema')} is not {INVENTORY_SCHEMA_VERSION}."
+            )
+            continue
+        try:
+            node = (
+                inventory.get("machine_id")
+                or inventory["node_name"]
+                or inventory["hostname"]
+            )
+            storage_free = int(inventory["storage"]["free"])
+            node_gpus = [
+                {
+                    "model": f"{gpu['vendor_id']}:{gpu['device_id']}",
+                    "description": gpu["description"],
+                    "isolated": int(gpu["isolated"]),
+                    "configured": int(gpu["configured"]),
+                    "degraded_link": int(is_link_degraded(gpu["link"])),
+                }
+                for gpu in inventory["gpus"]
+            ]
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Skipping '{inventory_path}': malformed, {e!r}.")
+            continue
 
-    golemsp_setup_cmd = [
-        "golemsp",
-        "setup",
-        "--no-interactive",
-        "--account",
-        account,
+        for gpu in node_gpus:
+            model = models.setdefault(
+                gpu["model"],
+                {
+                    "description": gpu["description"],
+                    "nodes": set(),
+                    "gpus": 0,
+                    "isolated": 0,
+                    "configured": 0,
+                    "degraded_links": 0,
+                    "storage_free": 0,
+                },
+            )
+            if node not in model["nodes"]:
+                # Storage is shared by the GPUs of a node
+                model["storage_free"] += storage_free
+                model["nodes"].add(node)
+            model["gpus"] += 1
+            model["isolated"] += gpu["isolated"]
+            model["configured"] += gpu["configured"]
+            model["degraded_links"] += gpu["degraded_link"]
+
+    rows = []
+    for model_id, model in sorted(models.items()):
+        rows.append(
+            {
+                "model": model_id,
+                **model,
+                "nodes": len(model["nodes"]),
+            }
+        )
+    return rows
+
+
+def print_capacity_table(rows):
+    columns = [
+        "model",
+        "nodes",
+        "gpus",
+        "isolated",
+        "configured",
+        "degraded_links",
+        "storage_free",
+        "description",
     ]
-    subprocess.run(golemsp_setup_cmd, check=True, env=env)
-
-    pre_install_cmd = ["ya-provider", "pre-install"]
-    subprocess.run(pre_install_cmd, check=True, env=env)
+    lines = [columns]
+    for row in rows:
+        lines.append(
+            [
+                str(row[column])
+                if column != "storage_free"
+                else f"{row[column] / 1024**4:.1f}T"
+                for column in columns
+            ]
+        )
+    widths = [max(len(line[i]) for line in lines) for i in range(len(columns))]
+    for line in lines:
+        print(
+            "  ".join(x.ljust(width) for x, width in zip(line, widths)).rstrip()
+        )
 
-    golemsp_manifest_bundle_cmd = [
-        "golemsp",
-        "manifest-bundle",
-        "add",
-        "/usr/lib/yagna/installer",
-    ]
-    subprocess.run(golemsp_manifest_bundle_cmd, check=True, env=env)
 
-    # Set node name if provided
-    if node_name:
-        golemsp_set_node_name_cmd = [
-            "golemsp",
-            "settings",
-            "set",
-            "--node-name",
-            node_name,
-        ]
-        subprocess.run(golemsp_set_node_name_cmd, check=True, env=env)
+def is_true(value):
+    return str(value).lower() in ("1", "true", "yes")
 
-    pricing_cmd = [
-        "--pricing",
-        "linear",
-        "--price",
-        f"Duration={duration_price}",
-        f"CPU={cpu_price}",
-    ]
-    preset_cmd = ["ya-provider", "preset"]
-    if preset_exists(runtime_id):
-        preset_cmd += ["update", "--name", runtime_id]
-    else:
-        preset_cmd += ["create", "--preset-name", runtime_id]
-    preset_cmd += ["--no-interactive", "--exe-unit", runtime_id] + pricing_cmd
-    subprocess.run(preset_cmd, check=True, env=env)
 
-    activate_cmd = ["ya-provider", "preset", "activate", runtime_id]
-    subprocess.run(activate_cmd, check=True, env=env)
+class ControlRequestError(Exception):
+    pass
 
 
-def bind_vfio(slots):
-    cmds = []
-    for slot in set(slots):
-        driver_override_path = f"/sys/bus/pci/devices/{slot}/driver_override"
-        bind_path = "/sys/bus/pci/drivers/vfio-pci/bind"
+class ControlService:
+    """
+    Apply configuration changes to a running node.
+
+    Each operation only runs the steps it affects (runtime file, a single
+    'ya-provider' or 'golemsp' command, VFIO binding of one GPU) and saves
+    the wizard configuration atomically. GPU changes are used by the
+    runtime on next provider restart.
+    """
+
+    # Operation: method, required and optional arguments
+    operations = {
+        "status": ("status", [], []),
+        "set-price": ("set_price", ["glm_per_hour"], []),
+        "set-node-name": ("set_node_name", ["node_name"], []),
+        "add-gpu": ("add_gpu", ["slot"], ["insecure"]),
+        "remove-gpu": ("remove_gpu", ["slot"], []),
+        "rebind-vfio": ("rebind_vfio", [], ["slot"]),
+    }
+
+    def __init__(self, conf_path, runtime_id="vm-nvidia", topology=None):
+        self.conf_path = conf_path
+        self.runtime_id = runtime_id
+        # Live PCI topology, resolved again on each request without it
+        self.topology = topology
+        self.lock = threading.Lock()
+
+    def _parse_request(self, request):
+        if not isinstance(request, dict):
+            raise ControlRequestError("Request must be a JSON object.")
+        op = request.get("op")
+        if op not in self.operations:
+            raise ControlRequestError(f"Unknown operation '{op}'.")
+        method, required, optional = self.operations[op]
+        args = request.get("args", {})
+        if not isinstance(args, dict):
+            raise ControlRequestError("Arguments must be a JSON object.")
+        missing = [key for key in required if key not in args]
+        if missing:
+            raise ControlRequestError(
+                f"Missing arguments for '{op}': {', '.join(missing)}."
+            )
+        unknown = [key for key in args if key not in required + optional]
+        if unknown:
+            raise ControlRequestError(
+                f"Unknown arguments for '{op}': {', '.join(unknown)}."
+            )
+        for key, value in args.items():
+            # Same as 'KEY=VALUE' parameters of 'golemwz control'
+            if not isinstance(value, (str, int, float, bool)):
+                raise ControlRequestError(f"Argument '{key}' must be a value.")
+        return getattr(self, method), {
+            key: str(value) for key, value in args.items()
+        }
 
-        if Path(f"/sys/bus/pci/drivers/vfio-pci/{slot}").exists():
-            continue
+    def handle(self, request):
+        start = time.perf_counter()
+        try:
+            handler, args = self._parse_request(request)
+            with self.lock, wizard_conf_lock():
+                # Reload each time to see changes saved by the wizard
+                wizard_conf = load_wizard_conf(self.conf_path)
+                result = handler(wizard_conf, **args)
+            response = {"ok": True, "result": result}
+        except ControlRequestError as e:
+            response = {
+                "ok": False,
+                "error": str(e),
+                "error_code": "invalid_request",
+            }
+        except (
+            WizardError,
+            ValueError,
+            OSError,
+            subprocess.CalledProcessError,
+        ) as e:
+            response = {"ok": False, "error": str(e), "error_code": "failed"}
+        except Exception as e:
+            # Bug, the daemon keeps serving other requests
+            logger.exception(f"Internal error on control request {request}")
+            response = {
+                "ok": False,
+                "error": f"Internal error: {e!r}",
+                "error_code": "internal",
+            }
+        response["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        logger.info(f"Control request {request}: {response}")
+        return response
+
+    def _save(self, wizard_conf):
+        write_wizard_conf(self.conf_path, wizard_conf)
+
+    def _get_gpu(self, wizard_conf, slot):
+        for gpu in wizard_conf.get("gpus", []):
+            if gpu["slot"] == slot:
+                return gpu
+        raise WizardError(f"GPU '{slot}' is not configured.")
+
+    def _get_driver(self, slot):
+        if self.topology:
+            return self.topology.get_driver(slot)
+        return _get_driver(Path("/sys/bus/pci/devices") / slot)
+
+    def status(self, wizard_conf):
+        return {
+            "glm_account": wizard_conf.get("glm_account", None),
+            "glm_per_hour": wizard_conf.get("glm_per_hour", None),
+            "glm_node_name": wizard_conf.get("glm_node_name", None),
+            "gpus": [
+                {
+                    "slot": gpu["slot"],
+                    "description": gpu["description"],
+                    "driver": self._get_driver(gpu["slot"]),
+                }
+                for gpu in wizard_conf.get("gpus", [])
+            ],
+        }
 
-        driver = Path(f"/sys/bus/pci/devices/{slot}/driver").resolve()
-        if driver.exists():
-            cmds += [f'echo "{slot}" > {driver}/unbind']
+    def set_price(self, wizard_conf, glm_per_hour):
+        try:
+            price = float(glm_per_hour)
+        except ValueError:
+            raise ControlRequestError("Price must be a number.")
+        if not math.isfinite(price):
+            raise ControlRequestError("Price must be a finite number.")
+        if price < 0:
+            raise ControlRequestError("Price cannot be negative.")
+        configure_pricing(
+            self.runtime_id,
+            price / 3600.0,
+            CPU_GLM_PER_HOUR_DEFAULT,
+        )
+        wizard_conf["glm_per_hour"] = str(glm_per_hour)
+        self._save(wizard_conf)
+        return {"glm_per_hour": wizard_conf["glm_per_hour"]}
+
+    def set_node_name(self, wizard_conf, node_name):
+        configure_node_name(node_name)
+        wizard_conf["glm_node_name"] = node_name
+        self._save(wizard_conf)
+        return {"glm_node_name": node_name}
+
+    def _set_gpus(self, wizard_conf, gpus):
+        gpus = sorted(gpus, key=lambda x: x["slot"])
+        configure_runtime(get_runtime_path(), gpus)
+        wizard_conf["gpus"] = gpus
+        self._save(wizard_conf)
+        return {
+            "gpus": [gpu["slot"] for gpu in gpus],
+            "restart_required": True,
+        }
 
-        cmds += [
-            f'echo vfio-pci > "{driver_override_path}"',
-            f'echo "{slot}" > "{bind_path}"',
-        ]
-    if Path("/sys/class/vtconsole/vtcon0/bind").exists():
-        cmds += ["echo 0 > /sys/class/vtconsole/vtcon0/bind"]
-    if Path("/sys/class/vtconsole/vtcon1/bind").exists():
-        cmds += ["echo 0 > /sys/class/vtconsole/vtcon1/bind"]
-    if Path(
-        "/sys/bus/platform/drivers/efi-framebuffer/efi-framebuffer.0"
-    ).exists():
-        cmds += [
-            "echo efi-framebuffer.0 > /sys/bus/platform/drivers/efi-framebuffer/unbind"
-        ]
-    cmds += ["modprobe -i vfio-pci"]
-    for cmd in cmds:
-        logger.debug(f"Running '{cmd}'")
-        subprocess.run(
-            ["sudo", "bash", "-c", cmd],
-            capture_output=True,
-            text=True,
-            check=True,
+    def add_gpu(self, wizard_conf, slot, insecure=False):
+        gpus = wizard_conf.get("gpus", [])
+        if slot in [gpu["slot"] for gpu in gpus]:
+            raise WizardError(f"GPU '{slot}' is already configured.")
+        compatible_gpus, _ = select_compatible_gpus(
+            insecure=is_true(insecure), parser=self.topology
+        )
+        if slot not in compatible_gpus:
+            raise WizardError(
+                f"GPU '{slot}' is not available or has bad isolation."
+            )
+        gpu = compatible_gpus[slot]
+        bind_vfio(gpu["vfio_devices"], self.topology)
+        return self._set_gpus(wizard_conf, gpus + [gpu])
+
+    def remove_gpu(self, wizard_conf, slot):
+        gpu = self._get_gpu(wizard_conf, slot)
+        gpus = [x for x in wizard_conf["gpus"] if x is not gpu]
+        if not gpus:
+            raise WizardError("Cannot remove the last GPU.")
+        return self._set_gpus(wizard_conf, gpus)
+
+    def rebind_vfio(self, wizard_conf, slot=None):
+        if slot:
+            gpus = [self._get_gpu(wizard_conf, slot)]
+        else:
+            gpus = wizard_conf.get("gpus", [])
+        bind_vfio(
+            [x for gpu in gpus for x in gpu["vfio_devices"]], self.topology
         )
+        return [probe_vfio_readiness(gpu) for gpu in gpus]
+
+
+class ControlRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        # One JSON request per line
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                response = {
+                    "ok": False,
+                    "error": f"Invalid request: {e}",
+                    "error_code": "invalid_request",
+                }
+            else:
+                response = self.server.service.handle(request)
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class ControlServer(
+    socketserver.ThreadingMixIn, socketserver.UnixStreamServer
+):
+    daemon_threads = True
+
+
+def run_control_daemon(wizard_conf_path, socket_path):
+    socket_path.unlink(missing_ok=True)
+    server = ControlServer(str(socket_path), ControlRequestHandler)
+    # Requests run with the privileges of the daemon
+    os.chmod(socket_path, 0o600)
+    server.service = ControlService(
+        wizard_conf_path, topology=create_live_topology()
+    )
+    logger.info(f"Serving control requests on '{socket_path}'.")
+    server.serve_forever()
+
+
+def control_request(socket_path, op, params):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(socket_path))
+        sock.sendall(json.dumps({"op": op, "args": params}).encode() + b"\n")
+        with sock.makefile("rb") as f:
+            return json.loads(f.readline())
 
 
 class WizardDialog:
@@ -665,6 +3350,7 @@ class WizardDialog:
         no_save: bool = False,
     ):
         cls.wizard_conf = wizard_conf
+        cls.is_visible = False
 
         cls.dialog.set_background_title("GOLEM Provider Wizard")
         if show_welcome:
@@ -673,12 +3359,25 @@ class WizardDialog:
         cls.storage_only = storage_only
         cls.no_save = no_save
 
+        cls.boot_report = BootReport()
+        cls.onboarding = show_welcome
+        cls.network_probe = None
+        cls.last_checkpoint = ""
+        cls.scratch_size = 0
+
         cls.device = None
         cls.glm_account = None
         cls.glm_per_hour = None
         cls.duration_price = None
         cls.selected_gpus = None
 
+    @classmethod
+    def _ensure_visible(cls):
+        # Only switch to the wizard console once user interaction is needed
+        if not cls.is_visible:
+            subprocess.run(["sudo", "/usr/bin/chvt", "6"])
+            cls.is_visible = True
+
     @classmethod
     def _auto_height(cls, width, text):
         _max = max(8, 5 + len(wrap(text, width=width)))  # Min of 8 rows
@@ -687,6 +3386,7 @@ class WizardDialog:
 
     @classmethod
     def yesno(cls, text, **info):
+        cls._ensure_visible()
         default = {"colors": True, "width": 72, "height": 8}
         default.update(info)
 
@@ -701,6 +3401,7 @@ class WizardDialog:
 
     @classmethod
     def inputbox(cls, text, **info):
+        cls._ensure_visible()
         default = {"colors": True, "width": 72, "height": 8}
         default.update(info)
 
@@ -719,6 +3420,7 @@ class WizardDialog:
 
     @classmethod
     def msgbox(cls, text, **info):
+        cls._ensure_visible()
         default = {"colors": True, "width": 72, "height": 8}
         default.update(info)
 
@@ -731,6 +3433,7 @@ class WizardDialog:
 
     @classmethod
     def menu(cls, text, **info):
+        cls._ensure_visible()
         default = {"colors": True, "width": 72, "height": 8}
         default.update(info)
 
@@ -743,6 +3446,7 @@ class WizardDialog:
 
     @classmethod
     def checklist(cls, text, **info):
+        cls._ensure_visible()
         default = {"colors": True, "width": 72, "height": 8}
         default.update(info)
 
@@ -755,6 +3459,7 @@ class WizardDialog:
 
     @classmethod
     def pause(cls, text, **info):
+        cls._ensure_visible()
         default = {"colors": True, "width": 72, "height": 8}
         default.update(info)
 
@@ -765,6 +3470,14 @@ class WizardDialog:
 
         return cls.dialog.pause(text, **default)
 
+    @classmethod
+    def infobox(cls, text, **info):
+        cls._ensure_visible()
+        default = {"width": 72, "height": 3}
+        default.update(info)
+
+        return cls.dialog.infobox(text, **default)
+
     def wizard_check_terms(self):
         logging.info("Check accepted license terms.")
         if not self.wizard_conf.get("accepted_terms", False):
@@ -802,18 +3515,53 @@ class WizardDialog:
                 begin_choices = [not_configure]
                 info = devices.values()
 
+            self.infobox("Measuring storage performance...")
+            benchmarks = benchmark_partitions(
+                devices.keys(),
+                self.wizard_conf.setdefault("storage_benchmarks", {}),
+            )
+            # Preselect the fastest partition, 'Golem storage' when none
+            # was measured
+            ranks = {
+                devname: rank
+                for rank, devname in enumerate(
+                    sorted(
+                        benchmarks,
+                        key=lambda x: benchmarks[x]["seq_read_mbps"],
+                        reverse=True,
+                    ),
+                    start=1,
+                )
+            }
+            if ranks:
+                default_partition = min(ranks, key=ranks.get)
+
+            stripe_candidates = get_stripe_candidates()
+            if len(stripe_candidates) >= 2:
+                end_choices = end_choices + [
+                    ("+", "Stripe several partitions or disks into one volume")
+                ]
+
             partition_choices = (
                 begin_choices
                 + [
-                    (dev["DEVNAME"], get_partition_description(dev))
+                    (
+                        dev["DEVNAME"],
+                        get_partition_description(
+                            dev,
+                            benchmarks.get(dev["DEVNAME"], None),
+                            ranks.get(dev["DEVNAME"], None),
+                        ),
+                    )
                     for dev in info
                 ]
                 + end_choices
             )
 
             code, partition_tag = self.menu(
-                "Select a storage partition:",
+                "Select a storage partition (sequential read, random read and write latency, speed rank):",
                 choices=partition_choices,
+                default_item=default_partition or "",
                 height=64,
                 width=128,
             )
@@ -824,6 +3572,25 @@ class WizardDialog:
                 ):
                     return
                 self.device = {"DEVNAME": "/dev/notset"}
+
+                code, scratch_tag = self.menu(
+                    "Provider data can be kept in RAM instead of the live USB stick. "
+                    "It is lost on reboot.",
+                    choices=[
+                        ("zram", "Compressed RAM disk (zstd)"),
+                        ("tmpfs", "Uncompressed RAM disk"),
+                        ("-", "Keep provider data on the live system"),
+                    ],
+                    height=12,
+                )
+                if code == self.dialog.OK and scratch_tag != "-":
+                    self.wizard_conf["scratch_storage"] = scratch_tag
+            elif partition_tag == "+":
+                self.device = self.wizard_configure_striped_storage(
+                    stripe_candidates, benchmarks
+                )
+                if not self.device:
+                    return
             else:
                 self.device = devices[partition_tag]
 
@@ -833,6 +3600,9 @@ class WizardDialog:
             self.device = self.wizard_conf["storage_partition"]
             resize_partition = False
 
+        if self.wizard_conf.get("storage_stripe", None):
+            assemble_striped_storage(self.wizard_conf["storage_stripe"])
+
         if self.device and self.device.get("DEVNAME", None) != "/dev/notset":
             configure_storage(
                 device=self.device, resize_partition=resize_partition
@@ -842,6 +3612,14 @@ class WizardDialog:
                 Path("~").expanduser() / "mnt/golem-gpu-live",
                 Path("~").expanduser() / ".local",
             )
+        elif self.wizard_conf.get("scratch_storage", None):
+            self.wizard_configure_scratch_storage()
+
+        if is_live_boot() and not os.path.ismount(
+            Path("~").expanduser() / ".local"
+        ):
+            # Provider data is on the volatile overlay, lost on reboot
+            self.wizard_reset_provider_data()
 
         if self.storage_only:
             logger.info(
@@ -849,8 +3627,93 @@ class WizardDialog:
             )
             return
 
+    def wizard_configure_striped_storage(self, candidates, benchmarks):
+        stripe_choices = [
+            (devname, get_stripe_description(block_device), False)
+            for devname, block_device in candidates.items()
+        ]
+        code, devnames = self.checklist(
+            "Select at least two partitions or disks to stripe (use spacebar for selection):",
+            choices=stripe_choices,
+            width=128,
+            height=32,
+        )
+        if code != self.dialog.OK or len(devnames) < 2:
+            self.msgbox("At least two partitions or disks are required.")
+            return None
+
+        msg = "ALL DATA WILL BE ERASED on:\n\n"
+        for devname in devnames:
+            msg += f"  - {devname} {get_stripe_description(candidates[devname])}\n"
+        msg += "\nDo you want to continue?"
+        if not self.yesno(msg, width=128, height=32):
+            return None
+
+        self.infobox("Creating striped storage...")
+        try:
+            stripe = create_striped_storage(devnames)
+        except (subprocess.CalledProcessError, KeyError) as e:
+            raise WizardError(f"Failed to create striped storage: {str(e)}")
+        self.wizard_conf["storage_stripe"] = stripe
+
+        md_devname = os.path.realpath(STRIPE_MD_DEVICE)
+        device = get_filtered_blkid_output().get(md_devname, None)
+        if not device:
+            raise WizardError("Cannot find striped storage filesystem.")
+
+        # Compare with the fastest single device already measured
+        stripe_benchmark = run_partition_benchmark(md_devname)
+        if stripe_benchmark:
+            msg = f"Striped storage: {stripe_benchmark['seq_read_mbps']:.0f} MB/s"
+            if benchmarks:
+                single = max(x["seq_read_mbps"] for x in benchmarks.values())
+                msg += f"\nFastest single partition: {single:.0f} MB/s"
+            logger.info(msg.replace("\n", ", "))
+            self.msgbox(msg)
+
+        return device
+
+    def wizard_configure_scratch_storage(self):
+        scratch_storage = self.wizard_conf["scratch_storage"]
+        gpu_count = len(self.wizard_conf.get("gpus", None) or []) or len(
+            PCIParser().get_devices(class_code=PCI_VGA_CLASS_ID, vendor="10de")
+        )
+        size = get_scratch_size(read_meminfo()["MemTotal"], gpu_count)
+        if size < SCRATCH_MIN_SIZE:
+            logger.warning(
+                f"Not enough memory for {gpu_count} GPU(s) and scratch storage, "
+                "keeping provider data on the live system."
+            )
+            return
+
+        logger.info(
+            f"Configure {scratch_storage} scratch storage of {size // 1024**2} MiB."
+        )
+        configure_scratch_storage(scratch_storage, size)
+        self.scratch_size = size
+        configure_bind_mount(
+            Path("~").expanduser() / "mnt/golem-gpu-live",
+            Path("~").expanduser() / ".local",
+        )
+
+        # Scratch storage is empty on every boot
+        self.wizard_reset_provider_data()
+
+    def wizard_reset_provider_data(self):
+        # Runtime, preset and resources are saved in ~/.local
+        self.wizard_conf["runtime_configured"] = False
+        self.wizard_conf["preset_configured"] = False
+        self.wizard_conf["resources_configured"] = False
+
     def wizard_configure_password(self):
         logging.info("Configure user password.")
+        if get_netboot_conf_url():
+            # Wizard state is lost on reboot, a generated password would be
+            # shown on each boot: only a served password hash is applied
+            if not self.wizard_conf.get("password_hash", None):
+                logger.info("No 'password_hash' served, password not set.")
+                return
+            self.wizard_conf["is_password_set"] = True
         if not self.wizard_conf.get("is_password_set", False):
             try:
                 password = get_random_string(14)
@@ -871,6 +3734,7 @@ class WizardDialog:
                 # Setup timeout for letting nm-online detecting activation
                 cur = 0
                 timeout = 30
+                self._ensure_visible()
                 self.dialog.gauge_start(
                     "Progress: 0%", title="Waiting for network activation..."
                 )
@@ -902,8 +3766,62 @@ class WizardDialog:
                     msg = "Cannot determine available IP addresses. Please check documentation."
                 self.msgbox(msg, height=8)
                 self.wizard_conf["is_password_set"] = True
+                if is_live_boot():
+                    self.wizard_conf["password_hash"] = get_password_hash(
+                        "golem"
+                    )
             except subprocess.CalledProcessError as e:
                 raise WizardError(f"Failed to set 'golem' password: {str(e)}.")
+        elif is_live_boot() and self.wizard_conf.get("password_hash", None):
+            # Restore the password lost with the volatile root filesystem
+            try:
+                subprocess.run(
+                    [
+                        "sudo",
+                        "usermod",
+                        "--password",
+                        self.wizard_conf["password_hash"],
+                        "golem",
+                    ],
+                    check=True,
+                    capture_output=True,
+                )
+                subprocess.run(
+                    [
+                        "sudo",
+                        "chage",
+                        "--lastday",
+                        time.strftime("%Y-%m-%d"),
+                        "golem",
+                    ],
+                    check=True,
+                    capture_output=True,
+                )
+            except subprocess.CalledProcessError as e:
+                raise WizardError(
+                    f"Failed to restore 'golem' password: {str(e)}."
+                )
+
+    def wizard_check_network(self):
+        if not self.network_probe or "network" in self.boot_report.results:
+            return
+        logging.info("Check network quality.")
+        self.network_probe.join()
+        self.boot_report.results["network"] = self.network_probe.results
+
+        issues = self.network_probe.get_issues()
+        if not issues:
+            return
+        msg = "Network quality may be too low for GPU tasks:\n\n"
+        msg += "\n".join(f"  - {issue}" for issue in issues)
+        logger.warning(msg)
+        if not self.onboarding:
+            return
+        if self.network_probe.conf["action"] == "pause":
+            if not self.yesno(f"{msg}\n\nWould you like to continue?"):
+                raise WizardError("Network quality is too low.")
+        else:
+            self.msgbox(msg, width=96, height=16)
 
     def wizard_configure_glm(self):
         logging.info("Configure GLM values.")
@@ -948,6 +3866,15 @@ class WizardDialog:
             )
             if bad_isolation_groups:
                 for device, iommu_group_devices in bad_isolation_groups:
+                    if device.iommu_group is None:
+                        self.msgbox(
+                            f"Cannot select '{device.description}'\n\n"
+                            "It has no IOMMU group, check that IOMMU is "
+                            "enabled in the firmware settings.",
+                            width=640,
+                            height=32,
+                        )
+                        continue
                     msg = f"Cannot select '{device.description}'\n\nIOMMU Group '{device.iommu_group}' has bad isolation:\n\n"
                     for iommu_device in iommu_group_devices:
                         msg += f"  - {iommu_device.slot} {iommu_device.description}\n"
@@ -1004,14 +3931,7 @@ class WizardDialog:
                 if not (plugins_dir / runtime_json.name).exists():
                     shutil.copy2(runtime_json, plugins_dir)
 
-            runtime_path = (
-                (
-                    Path("~").expanduser()
-                    / ".local/lib/yagna/plugins/ya-runtime-vm-nvidia.json"
-                )
-                .expanduser()
-                .resolve()
-            )
+            runtime_path = get_runtime_path()
             if not runtime_path:
                 raise WizardError(
                     f"Cannot find runtime configuration file '{runtime_path}'."
@@ -1050,10 +3970,37 @@ class WizardDialog:
                     cpu_price=CPU_GLM_PER_HOUR_DEFAULT,
                     node_name=glm_node_name,
                 )
+                if glm_node_name:
+                    self.wizard_conf["glm_node_name"] = glm_node_name
                 self.wizard_conf["preset_configured"] = True
             except subprocess.CalledProcessError as e:
                 raise WizardError(f"Failed to configure preset: {str(e)}.")
 
+    def get_resource_limits(self):
+        return derive_resource_limits(
+            get_host_capacity(Path("~").expanduser() / ".local"),
+            len(self.selected_gpus),
+            reserved_memory=self.scratch_size,
+        )
+
+    def wizard_configure_resources(self):
+        logging.info("Configure provider resources.")
+        limits = self.get_resource_limits()
+        if limits != self.wizard_conf.get("resource_limits", None):
+            # First sizing or hardware changed
+            self.wizard_conf["resources_configured"] = False
+        if not self.wizard_conf.get("resources_configured", False):
+            logger.info(
+                f"Offering {limits['cores']} cores, {limits['memory_gib']} "
+                f"GiB of memory and {limits['disk_gib']} GiB of disk."
+            )
+            try:
+                configure_resources(limits)
+            except subprocess.CalledProcessError as e:
+                raise WizardError(f"Failed to configure resources: {str(e)}.")
+            self.wizard_conf["resource_limits"] = limits
+            self.wizard_conf["resources_configured"] = True
+
     def wizard_configure_vfio(self):
         # Add warning about a possible screen freeze
         logging.info(MSG_FREEZE)
@@ -1070,23 +4017,97 @@ class WizardDialog:
                     f"Failed to attach devices to VFIO: {str(e)}. Already bound?"
                 )
 
+            readiness = [
+                probe_vfio_readiness(gpu) for gpu in self.selected_gpus
+            ]
+            self.boot_report.results["vfio_readiness"] = readiness
+            ready_slots = [x["slot"] for x in readiness if x["ready"]]
+            for gpu_readiness in readiness:
+                if not gpu_readiness["ready"]:
+                    logger.warning(
+                        f"GPU '{gpu_readiness['slot']}' is not ready for "
+                        f"passthrough: {' '.join(gpu_readiness['problems'])}"
+                    )
+            if not ready_slots:
+                raise WizardError("No GPU ready for passthrough.")
+
+            # Only advertise GPUs which can be handed to a VM
+            configure_runtime(
+                get_runtime_path(),
+                [x for x in self.selected_gpus if x["slot"] in ready_slots],
+            )
+
         # Create the same file as "as-provider" script
         terms_path = Path("~").expanduser() / ".local/share/ya-installer/terms"
         terms_path.mkdir(parents=True, exist_ok=True)
         if not (terms_path / "testnet-01.tag").exists():
             (terms_path / "testnet-01.tag").write_text("")
 
-    def wizard_save_config(self, no_save=False):
-        logging.info("Save Wizard configuration file.")
+    def wizard_configure_kernel_profile(self):
+        logging.info("Configure kernel parameters.")
+        # Network boot parameters are set by the boot server
+        if self.no_save or get_netboot_conf_url():
+            return
+        # Kernel parameters only apply on next boot, don't fail the wizard
+        try:
+            confirm_kernel_profile_boot()
+            profile = derive_kernel_profile(
+                get_kernel_profile_inputs(self.selected_gpus),
+                early_vfio=self.wizard_conf.get("early_vfio", False),
+            )
+            validate_kernel_profile(profile)
+            if profile != self.wizard_conf.get("kernel_profile", None):
+                logger.info(f"New kernel profile: {' '.join(profile)}")
+                write_kernel_profile(profile)
+                self.wizard_conf["kernel_profile"] = profile
+        except (OSError, subprocess.CalledProcessError, WizardError) as e:
+            logger.warning(f"Failed to configure kernel parameters: {str(e)}")
+
+    def _get_checkpoint_digest(self, step, keys, inputs=None):
+        # Chained with previous steps: any change reruns all following ones.
+        # 'inputs' are those which are not part of the configuration.
+        inputs = {
+            **(inputs or {}),
+            **{key: self.wizard_conf.get(key, None) for key in keys},
+        }
+        return hashlib.sha256(
+            json.dumps(
+                [self.last_checkpoint, step, inputs], sort_keys=True
+            ).encode()
+        ).hexdigest()
+
+    def wizard_resume(self, step, keys, flag, inputs=None):
+        checkpoints = self.wizard_conf.get("checkpoints", {})
+        if step in checkpoints and checkpoints[step] != (
+            self._get_checkpoint_digest(step, keys, inputs)
+        ):
+            logger.info(f"Inputs of step '{step}' changed, running it again.")
+            self.wizard_conf.pop(flag, None)
+
+    def wizard_checkpoint(self, step, keys, inputs=None):
+        digest = self._get_checkpoint_digest(step, keys, inputs)
+        self.last_checkpoint = digest
+        checkpoints = self.wizard_conf.setdefault("checkpoints", {})
+        if checkpoints.get(step, None) != digest:
+            checkpoints[step] = digest
+            self.wizard_write_config()
+
+    def wizard_write_config(self):
         if not self.no_save:
-            # Save Wizard configuration
             try:
-                wizard_conf_path.write_text(tomli_w.dumps(self.wizard_conf))
-            except toml.TomlDecodeError as e:
+                with wizard_conf_lock():
+                    write_wizard_conf(wizard_conf_path, self.wizard_conf)
+            except (OSError, subprocess.CalledProcessError) as e:
                 raise WizardError(
                     f"Failed to save configuration file: {str(e)}"
                 )
 
+    def wizard_save_config(self, no_save=False):
+        logging.info("Save Wizard configuration file.")
+        if not self.no_save:
+            # Save Wizard configuration
+            self.wizard_write_config()
+
             # Once Wizard configuration written, we delete the first boot configuration
             try:
                 subprocess.run(
@@ -1102,32 +4123,154 @@ class WizardDialog:
         if not Path("/sys/firmware/efi").exists():
             self.msgbox("System is not started in UEFI mode!")
 
+        self.boot_report.milestone("started", "Starting wizard")
+
+        # Each completed step is saved right away with a digest of its
+        # inputs, a later run resumes from the first step whose inputs
+        # changed
+
         # TERMS OF USE
         self.wizard_check_terms()
+        self.wizard_checkpoint("terms", ["accepted_terms"])
 
         # STORAGE
         self.wizard_configure_storage()
+        self.wizard_checkpoint(
+            "storage",
+            ["storage_partition", "storage_stripe", "scratch_storage"],
+        )
+        self.boot_report.milestone("storage_mounted", "Storage mounted")
 
-        # CONFIGURE PASSWORD
-        self.wizard_configure_password()
+        if self.storage_only:
+            return
+
+        # NETWORK QUALITY, measured while other steps run
+        self.network_probe = NetworkProbe(
+            self.wizard_conf.get("network_probe", {})
+        )
+        self.network_probe.start()
 
         # GLM related values
         self.wizard_configure_glm()
+        self.wizard_checkpoint("glm", ["glm_account", "glm_per_hour"])
 
         # GPUs
         self.wizard_configure_gpus()
+        self.wizard_checkpoint("gpus", ["gpus"])
 
-        # CONFIGURE RUNTIME
+        # CONFIGURE RUNTIME for the selected GPUs from the shipped runtime
+        runtime_inputs = {"plugins": get_runtime_plugins_digest()}
+        self.wizard_resume(
+            "runtime", ["gpus"], "runtime_configured", runtime_inputs
+        )
         self.wizard_configure_runtime()
+        self.wizard_checkpoint("runtime", ["gpus"], runtime_inputs)
+        self.boot_report.milestone("runtime_configured", "Runtime configured")
+
+        # Onboarding waits for network quality before the last step
+        if self.onboarding:
+            self.wizard_check_network()
 
         # CONFIGURE PRESET
+        self.wizard_resume("preset", ["glm_node_name"], "preset_configured")
         self.wizard_configure_preset()
+        self.wizard_checkpoint("preset", ["glm_node_name"])
+        self.boot_report.milestone("preset_configured", "Preset configured")
+
+        # RESOURCES offered to tasks, sized from the host capacity
+        resources_keys = ["gpus", "scratch_storage"]
+        resources_inputs = {"limits": self.get_resource_limits()}
+        self.wizard_resume(
+            "resources",
+            resources_keys,
+            "resources_configured",
+            resources_inputs,
+        )
+        self.wizard_configure_resources()
+        self.wizard_checkpoint("resources", resources_keys, resources_inputs)
 
         # VFIO
         self.wizard_configure_vfio()
+        self.boot_report.milestone("vfio_configured", "Passthrough configured")
+
+        # Everything GOLEM SP needs is ready, following steps don't block it
+        self.boot_report.ready()
+
+        # CONFIGURE PASSWORD
+        self.wizard_configure_password()
+        self.wizard_checkpoint("password", ["is_password_set"])
+
+        # KERNEL PARAMETERS
+        self.wizard_configure_kernel_profile()
+
+        # NETWORK QUALITY
+        self.wizard_check_network()
 
         # Save running config
         self.wizard_save_config()
+        self.boot_report.milestone("config_saved", "Configuration saved")
+        self.boot_report.save()
+
+
+def run_command(args, wizard_conf_path):
+    if args.command == "monitor":
+        run_monitor(wizard_conf_path, args.listen, args.interval)
+    elif args.command == "storage-bench":
+        print(json.dumps(benchmark_partition(args.devname, args.time_budget)))
+    elif args.command == "boot-report":
+        BootReport.show()
+    elif args.command == "upgrade-gate":
+        if not upgrade_gate(args.state, args.max_deferral, args.proc_root):
+            return 1
+    elif args.command == "power-manager":
+        run_power_manager(
+            wizard_conf_path,
+            args.interval,
+            once=args.once,
+            wake_budget_ms=args.wake_budget_ms,
+            sysfs_root=args.sysfs_root,
+            proc_root=args.proc_root,
+            state_path=args.state,
+        )
+    elif args.command == "log-flush":
+        flush_logs(max_bytes=args.max_bytes)
+    elif args.command == "inventory":
+        inventory = get_inventory(
+            load_wizard_conf(wizard_conf_path),
+            allow_pci_bridge=not args.no_relax_gpu_isolation,
+            insecure=args.insecure,
+            cache_path=args.cache,
+        )
+        if args.json:
+            print(json.dumps(inventory, indent=4))
+        else:
+            for gpu in inventory["gpus"]:
+                print(
+                    f"{gpu['slot']}  {gpu['description']}  "
+                    f"group={gpu['iommu_group']} isolated={gpu['isolated']} "
+                    f"numa={gpu['numa_node']} "
+                    f"x{gpu['link']['current_width']}"
+                )
+    elif args.command == "inventory-merge":
+        rows = merge_inventories(args.files)
+        if args.json:
+            print(json.dumps(rows, indent=4))
+        else:
+            print_capacity_table(rows)
+    elif args.command == "control-daemon":
+        run_control_daemon(wizard_conf_path, args.socket)
+    elif args.command == "control":
+        params = {}
+        for param in args.params:
+            key, sep, value = param.partition("=")
+            if not sep:
+                raise WizardError(f"Invalid parameter '{param}'.")
+            params[key] = value
+        response = control_request(args.socket, args.op, params)
+        print(json.dumps(response, indent=4))
+        if not response["ok"]:
+            return 1
+    return 0
 
 
 if __name__ == "__main__":
@@ -1136,17 +4279,33 @@ if __name__ == "__main__":
     try:
         args = parse_args()
 
-        setup_logging(args.debug)
+        # Wizard configuration file path
+        wizard_conf_path = get_wizard_conf_path()
+
+        if args.command:
+            logging.basicConfig(
+                level=logging.DEBUG if args.debug else logging.INFO,
+                format="[%(levelname)s] %(message)s",
+            )
+            sys.exit(run_command(args, wizard_conf_path))
 
-        mount_conf_storage()
+        setup_logging(args.debug)
 
         wizard_conf = {}
 
-        # If exists, the first boot configuration file path provided in Golem conf partition
-        firstboot_wizard_conf_path = Path("/mnt/golemwz.toml")
+        netboot_conf_url = get_netboot_conf_url()
+        if netboot_conf_url:
+            # Node configuration served by the boot server replaces the
+            # first boot configuration of the conf partition
+            firstboot_wizard_conf_path = (
+                Path("~").expanduser().resolve() / "golemwz-node.toml"
+            )
+            fetch_netboot_conf(netboot_conf_url, firstboot_wizard_conf_path)
+        else:
+            mount_conf_storage()
 
-        # Wizard configuration file path
-        wizard_conf_path = Path("~").expanduser().resolve() / ".golemwz.toml"
+            # If exists, the first boot configuration file path provided in Golem conf partition
+            firstboot_wizard_conf_path = Path("/mnt/golemwz.toml")
 
         try:
             conf_to_load = None
@@ -1187,6 +4346,11 @@ if __name__ == "__main__":
             no_save=args.no_save,
         )
         wizard_dialog.run()
+    except SystemExit as e:
+        # Exit codes of commands, messages of the wizard (e.g. Escape key)
+        if e.code is None or isinstance(e.code, int):
+            raise
+        err_msg = str(e.code)
     except KeyboardInterrupt:
         err_msg = "Interrupting..."
     except WizardError as e:
@@ -1196,6 +4360,10 @@ if __name__ == "__main__":
 
     if err_msg:
         logger.error(err_msg)
+        sd_notify(f"STATUS={err_msg}\nERRNO=1")
         if wizard_dialog:
             wizard_dialog.msgbox(err_msg)
         sys.exit(1)
+
+    # Exiting before readiness would fail the unit, e.g. '--storage-only'
+    sd_notify("READY=1")
@@ -0,0 +1,116 @@
+#!/bin/bash
+
+# Prune kernel modules and firmware to the allow-lists of this directory,
+# then compress the remaining firmware. Run inside the rootfs, before the
+# initramfs is rebuilt.
+#
+# - modules.allow: glob patterns relative to /lib/modules/<version>/kernel,
+#   dependencies of the kept modules are kept too.
+# - firmware.allow: glob patterns relative to /lib/firmware, firmware files
+#   declared by the kept modules are kept too.
+# - hardware.survey (optional): modaliases of the fleet hardware, one per
+#   line (e.g. from '/sys/bus/*/devices/*/modalias'), their modules are kept
+#   whatever the allow-list.
+
+set -eu -o pipefail
+
+PRUNE_DIR="${1:-"$(readlink -f "$(dirname "$0")")"}"
+KVER="${KVER:-"$(ls /lib/modules | sort -V | tail -n 1)"}"
+MODULES_DIR="/lib/modules/${KVER}"
+FIRMWARE_DIR="/lib/firmware"
+KEEP_MODULES="$(mktemp)"
+KEEP_FIRMWARE="$(mktemp)"
+
+trap 'rm -f "${KEEP_MODULES}" "${KEEP_FIRMWARE}" "${KEEP_FIRMWARE}.all"' 0 1 2 3 6 15
+
+read_patterns() {
+    # Allow-list without comments nor empty lines
+    sed -e 's/#.*//' -e 's/[[:space:]]*$//' -e '/^$/d' "$1"
+}
+
+matches() {
+    # Whether a path matches one of the given glob patterns
+    local path="$1"
+    shift
+    local pattern
+    for pattern in "$@"; do
+        # shellcheck disable=SC2053
+        if [[ "${path}" == ${pattern} ]]; then
+            return 0
+        fi
+    done
+    return 1
+}
+
+echo "Before pruning: modules $(du -sh "${MODULES_DIR}" | cut -f1), firmware $(du -sh "${FIRMWARE_DIR}" | cut -f1)"
+
+# Modules of the allow-list
+mapfile -t patterns < <(read_patterns "${PRUNE_DIR}/modules.allow")
+while IFS= read -r module; do
+    if matches "${module#kernel/}" "${patterns[@]}"; then
+        echo "${module}"
+    fi
+done < <(cd "${MODULES_DIR}" && find kernel -name '*.ko*') > "${KEEP_MODULES}"
+
+# Modules of the surveyed hardware
+if [ -f "${PRUNE_DIR}/hardware.survey" ]; then
+    while IFS= read -r modalias; do
+        for name in $(modprobe -S "${KVER}" -R "${modalias}" 2>/dev/null); do
+            module="$(modinfo -k "${KVER}" -n "${name}")"
+            # built-in modules have no file
+            if [[ "${module}" == "${MODULES_DIR}"/kernel/* ]]; then
+                echo "${module#"${MODULES_DIR}"/}"
+            fi
+        done
+    done < <(read_patterns "${PRUNE_DIR}/hardware.survey") >> "${KEEP_MODULES}"
+fi
+
+# Dependencies, modules.dep lists them all for each module
+awk -F ':' -v keep="${KEEP_MODULES}" '
+    BEGIN { while ((getline line < keep) > 0) kept[line] = 1 }
+    ($1 in kept) { print $1; n = split($2, deps, " "); for (i = 1; i <= n; i++) print deps[i] }
+' "${MODULES_DIR}/modules.dep" | sort -u -o "${KEEP_MODULES}"
+
+(cd "${MODULES_DIR}" && find kernel -name '*.ko*') | sort | comm -23 - "${KEEP_MODULES}" | \
+    (cd "${MODULES_DIR}" && xargs -r -d '\n' rm -f)
+find "${MODULES_DIR}/kernel" -type d -empty -delete
+depmod -a "${KVER}"
+
+# Firmware of the allow-list and of the kept modules
+{
+    read_patterns "${PRUNE_DIR}/firmware.allow"
+    sed "s|^|${MODULES_DIR}/|" "${KEEP_MODULES}" | xargs -r modinfo -k "${KVER}" -F firmware
+} | sort -u > "${KEEP_FIRMWARE}"
+mapfile -t patterns < "${KEEP_FIRMWARE}"
+
+cd "${FIRMWARE_DIR}"
+find . \( -type f -o -type l \) -printf '%P\n' | sort > "${KEEP_FIRMWARE}.all"
+while IFS= read -r firmware; do
+    if matches "${firmware}" "${patterns[@]}"; then
+        echo "${firmware}"
+        # A kept symlink keeps its targets
+        while [ -L "${firmware}" ]; do
+            firmware="$(realpath -s -m --relative-to=. "$(dirname "${firmware}")/$(readlink "${firmware}")")"
+            echo "${firmware}"
+        done
+    fi
+done < "${KEEP_FIRMWARE}.all" | sort -u > "${KEEP_FIRMWARE}"
+comm -23 "${KEEP_FIRMWARE}.all" "${KEEP_FIRMWARE}" | xargs -r -d '\n' rm -f
+rm -f "${KEEP_FIRMWARE}.all"
+find . -xtype l -delete
+find . -type d -empty -delete
+
+# The kernel loads xz compressed firmware (with crc32 checks) when built with
+# firmware compression support
+if grep -qE '^CONFIG_FW_LOADER_COMPRESS(_XZ)?=y' "/boot/config-${KVER}"; then
+    mapfile -t links < <(find . -type l -printf '%P\n')
+    for link in "${links[@]}"; do
+        if [ -f "${link}" ]; then
+            ln -sfn "$(readlink "${link}").xz" "${link}.xz"
+            rm -f "${link}"
+        fi
+    done
+    find . -type f ! -name '*.xz' -print0 | xargs -0 -r xz -C crc32 -T0
+fi
+
+echo "After pruning: modules $(du -sh "${MODULES_DIR}" | cut -f1), firmware $(du -sh "${FIRMWARE_DIR}" | cut -f1)"
@@ -0,0 +1,75 @@
+#!/bin/bash
+
+# Report the sizes of the assembled rootfs, its kernel modules, firmware and
+# initramfs and of the built images and, with BOOT_IMAGE set, the time taken
+# to boot it under QEMU. With a baseline report, e.g. of a build without
+# pruning, both are compared.
+
+set -eu -o pipefail
+
+if [ $# -lt 2 ]; then
+    echo "Usage: $0 <work directory> <report> [<baseline report>]"
+    exit 1
+fi
+
+LOCALDIR="$(readlink -f "$(dirname "$0")")"
+WORKDIR="$1"
+REPORT="$2"
+BASELINE="${3:-}"
+BOOT_IMAGE="${BOOT_IMAGE:-}"
+
+size_mib() {
+    # Allocated size, images are sparse. Symlinks are not followed, absolute
+    # ones of the rootfs point into the host
+    du -sm "$@" | tail -n 1 | cut -f1
+}
+
+rootfs_path() {
+    # Resolve a symlink of the rootfs within the rootfs
+    local path="${WORKDIR}/rootfs$1" target
+    if ! target="$(readlink "${path}")"; then
+        echo "${path}"
+    elif [ "${target#/}" != "${target}" ]; then
+        echo "${WORKDIR}/rootfs${target}"
+    else
+        echo "$(dirname "${path}")/${target}"
+    fi
+}
+
+latest() {
+    # Latest built file matching a pattern, if any
+    ls -t "${WORKDIR}"/$1 2>/dev/null | head -n 1 || true
+}
+
+mkdir -p "$(dirname "${REPORT}")"
+{
+    echo "rootfs_mib $(size_mib "${WORKDIR}/rootfs")"
+    echo "modules_mib $(size_mib "${WORKDIR}/rootfs/lib/modules")"
+    echo "firmware_mib $(size_mib "${WORKDIR}/rootfs/lib/firmware")"
+    echo "initramfs_mib $(size_mib "$(rootfs_path /boot/initrd.img)")"
+    for artifact in squashfs:filesystem.squashfs image:golem-gpu-live-*.img iso:golem-gpu-live-*.iso; do
+        file="$(latest "${artifact#*:}")"
+        if [ -n "${file}" ]; then
+            echo "${artifact%%:*}_mib $(size_mib "${file}")"
+        fi
+    done
+    if [ -n "${BOOT_IMAGE}" ]; then
+        boot_seconds="$("${LOCALDIR}/boot-qemu.sh" "${BOOT_IMAGE}" | sed -n "s/.*reached 'login:' in \([0-9]*\)s\./\1/p")"
+        echo "boot_seconds ${boot_seconds}"
+    fi
+} > "${REPORT}"
+
+awk -v baseline="${BASELINE}" '
+    BEGIN {
+        while (baseline != "" && (getline line < baseline) > 0) {
+            split(line, fields, " ")
+            base[fields[1]] = fields[2]
+        }
+        printf "%-16s %10s %10s %8s\n", "", "baseline", "current", "change"
+    }
+    {
+        b = ($1 in base) ? base[$1] : "-"
+        change = (b != "-" && b > 0) ? sprintf("%+.1f%%", ($2 - b) * 100 / b) : "-"
+        printf "%-16s %10s %10s %8s\n", $1, b, $2, change
+    }
+' "${REPORT}"
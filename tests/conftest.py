@@ -0,0 +1,34 @@
+import importlib.machinery
+import importlib.util
+import os
+import shutil
+import stat
+
+import pytest
+
+GOLEMWZ_PATH = os.path.join(
+    os.path.dirname(__file__), os.pardir, "rootfs", "golemwz.py"
+)
+
+
+@pytest.fixture
+def golemwz(tmp_path, monkeypatch):
+    if not shutil.which("dialog"):
+        # The wizard creates its Dialog on import, no box is shown here
+        dialog_path = tmp_path / "bin" / "dialog"
+        dialog_path.parent.mkdir()
+        dialog_path.write_text("#!/bin/sh\necho 'Version: 1.3-20211214'\n")
+        dialog_path.chmod(dialog_path.stat().st_mode | stat.S_IXUSR)
+        monkeypatch.setenv(
+            "PATH", f"{dialog_path.parent}{os.pathsep}{os.environ['PATH']}"
+        )
+
+    loader = importlib.machinery.SourceFileLoader("golemwz", GOLEMWZ_PATH)
+    spec = importlib.util.spec_from_loader("golemwz", loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+
+    monkeypatch.setattr(
+        module, "WIZARD_CONF_LOCK_PATH", tmp_path / "golemwz.lock"
+    )
+    return module
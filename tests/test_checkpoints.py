@@ -0,0 +1,202 @@
+"""
+Fault injection on the wizard checkpoints: a run interrupted in the middle
+resumes from the first unfinished step, and a changed input reruns the
+steps which depend on it.
+"""
+
+import pytest
+import toml
+
+RESOURCE_LIMITS = {"cores": 8, "memory_gib": 32, "disk_gib": 100}
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.fixture
+def golemwz(golemwz, tmp_path, monkeypatch):
+    # Global set by the main script
+    golemwz.wizard_conf_path = tmp_path / "golemwz.toml"
+    monkeypatch.setattr(golemwz, "sd_notify", lambda state: None)
+    monkeypatch.setattr(golemwz.BootReport, "save", lambda self: None)
+    monkeypatch.setattr(
+        golemwz, "get_runtime_plugins_digest", lambda: "plugins-v1"
+    )
+    return golemwz
+
+
+class FakeSteps:
+    """
+    Wizard steps which only record what they configured, 'fail_at' raises
+    before a step completes, like a power loss.
+    """
+
+    def __init__(self, golemwz, monkeypatch, fail_at=None):
+        self.configured = []
+        self.fail_at = fail_at
+        wizard = golemwz.WizardDialog
+
+        monkeypatch.setattr(wizard, "msgbox", lambda *args, **kw: None)
+        # No first boot configuration to delete
+        monkeypatch.setattr(
+            wizard, "wizard_save_config", wizard.wizard_write_config
+        )
+        monkeypatch.setattr(
+            golemwz, "NetworkProbe", lambda *args: FakeNetworkProbe()
+        )
+        monkeypatch.setattr(
+            wizard, "get_resource_limits", lambda self: RESOURCE_LIMITS
+        )
+        for method, step in [
+            ("wizard_check_terms", "terms"),
+            ("wizard_configure_storage", "storage"),
+            ("wizard_configure_glm", "glm"),
+            ("wizard_configure_gpus", "gpus"),
+            ("wizard_configure_vfio", "vfio"),
+            ("wizard_configure_password", "password"),
+            ("wizard_configure_kernel_profile", "kernel_profile"),
+            ("wizard_check_network", "network"),
+        ]:
+            monkeypatch.setattr(wizard, method, self._step(step))
+        for method, step in [
+            ("wizard_configure_runtime", "runtime"),
+            ("wizard_configure_preset", "preset"),
+            ("wizard_configure_resources", "resources"),
+        ]:
+            monkeypatch.setattr(wizard, method, self._flagged_step(step))
+
+    def _step(self, step):
+        def configure(wizard):
+            if step == self.fail_at:
+                raise Interrupted(step)
+            if step == "gpus":
+                wizard.selected_gpus = wizard.wizard_conf.setdefault(
+                    "gpus", [{"slot": "0000:01:00.0"}]
+                )
+            elif step == "terms":
+                wizard.wizard_conf["accepted_terms"] = True
+
+        return configure
+
+    def _flagged_step(self, step):
+        # Configured once, until its flag is cleared
+        def configure(wizard):
+            if step == self.fail_at:
+                raise Interrupted(step)
+            if not wizard.wizard_conf.get(f"{step}_configured", False):
+                self.configured.append(step)
+                wizard.wizard_conf[f"{step}_configured"] = True
+
+        return configure
+
+
+class FakeNetworkProbe:
+    def start(self):
+        pass
+
+
+def run_wizard(golemwz, monkeypatch, fail_at=None):
+    steps = FakeSteps(golemwz, monkeypatch, fail_at)
+    wizard_conf = {}
+    if golemwz.wizard_conf_path.exists():
+        wizard_conf = toml.loads(golemwz.wizard_conf_path.read_text())
+    golemwz.WizardDialog(wizard_conf=wizard_conf).run()
+    return steps.configured
+
+
+def saved_conf(golemwz):
+    return toml.loads(golemwz.wizard_conf_path.read_text())
+
+
+CHECKPOINTED_STEPS = [
+    "terms",
+    "storage",
+    "glm",
+    "gpus",
+    "runtime",
+    "preset",
+    "resources",
+]
+FLAGGED_STEPS = ["runtime", "preset", "resources"]
+
+
+@pytest.mark.parametrize("fail_at", CHECKPOINTED_STEPS)
+def test_interrupted_run_resumes_from_unfinished_step(
+    golemwz, monkeypatch, fail_at
+):
+    with pytest.raises(Interrupted):
+        run_wizard(golemwz, monkeypatch, fail_at=fail_at)
+
+    # Steps before the failure are saved
+    done = CHECKPOINTED_STEPS[: CHECKPOINTED_STEPS.index(fail_at)]
+    if golemwz.wizard_conf_path.exists():
+        conf = saved_conf(golemwz)
+    else:
+        conf = {}
+    assert list(conf.get("checkpoints", {})) == done
+    for step in FLAGGED_STEPS:
+        assert conf.get(f"{step}_configured", False) == (step in done)
+
+    # Only the failed step and the later ones are configured again
+    assert run_wizard(golemwz, monkeypatch) == [
+        step for step in FLAGGED_STEPS if step not in done
+    ]
+    assert run_wizard(golemwz, monkeypatch) == []
+
+
+def test_interrupted_save_keeps_previous_configuration(golemwz, monkeypatch):
+    run_wizard(golemwz, monkeypatch)
+
+    def interrupted_replace(src, dst):
+        raise Interrupted("replace")
+
+    # Power loss before the rename of the new configuration
+    monkeypatch.setattr(golemwz.os, "replace", interrupted_replace)
+    conf = saved_conf(golemwz)
+    conf["gpus"] = [{"slot": "0000:02:00.0"}]
+    golemwz.wizard_conf_path.write_text(toml.dumps(conf))
+    with pytest.raises(Interrupted):
+        run_wizard(golemwz, monkeypatch)
+
+    assert golemwz.wizard_conf_path.read_text() == toml.dumps(conf)
+
+
+@pytest.mark.parametrize(
+    "change, rerun",
+    [
+        (
+            lambda golemwz, conf: conf.update(
+                gpus=[{"slot": "0000:02:00.0"}]
+            ),
+            ["runtime", "preset", "resources"],
+        ),
+        (
+            lambda golemwz, conf: setattr(
+                golemwz,
+                "get_runtime_plugins_digest",
+                lambda: "plugins-v2",
+            ),
+            ["runtime", "preset", "resources"],
+        ),
+        (
+            lambda golemwz, conf: conf.update(glm_node_name="other-node"),
+            ["preset", "resources"],
+        ),
+        (
+            lambda golemwz, conf: RESOURCE_LIMITS.update(cores=4),
+            ["resources"],
+        ),
+    ],
+)
+def test_changed_input_reruns_following_steps(
+    golemwz, monkeypatch, change, rerun
+):
+    monkeypatch.setitem(RESOURCE_LIMITS, "cores", RESOURCE_LIMITS["cores"])
+    run_wizard(golemwz, monkeypatch)
+
+    conf = saved_conf(golemwz)
+    change(golemwz, conf)
+    golemwz.wizard_conf_path.write_text(toml.dumps(conf))
+
+    assert run_wizard(golemwz, monkeypatch) == rerun
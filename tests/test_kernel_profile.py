@@ -0,0 +1,186 @@
+"""
+Kernel parameters derived from fake sysfs and '/proc' trees of typical
+GPU rigs.
+"""
+
+import pytest
+
+GPU = "0000:01:00.0"
+GPU_AUDIO = "0000:01:00.1"
+SECOND_GPU = "0000:02:00.0"
+IGPU = "0000:00:02.0"
+
+PASSTHROUGH_GPU = {"slot": GPU, "vfio_devices": [GPU, GPU_AUDIO]}
+
+
+def make_host(
+    root, cpu_vendor="GenuineIntel", devices=None, serial_ports=None
+):
+    """
+    'devices' maps slots to their PCI class and whether they are the boot
+    VGA device, 'serial_ports' tty names to their UART type.
+    """
+    proc_root = root / "proc"
+    proc_root.mkdir()
+    (proc_root / "cpuinfo").write_text(
+        f"processor\t: 0\nvendor_id\t: {cpu_vendor}\ncpu family\t: 6\n"
+    )
+    sysfs_root = root / "sys"
+    for slot, (pci_class, boot_vga) in (devices or {}).items():
+        device_path = sysfs_root / "bus/pci/devices" / slot
+        device_path.mkdir(parents=True)
+        (device_path / "class").write_text(f"{pci_class}\n")
+        if pci_class.startswith("0x0300"):
+            (device_path / "boot_vga").write_text(f"{int(boot_vga)}\n")
+    for tty, uart_type in (serial_ports or {}).items():
+        tty_path = sysfs_root / "class/tty" / tty
+        tty_path.mkdir(parents=True)
+        (tty_path / "type").write_text(f"{uart_type}\n")
+    (sysfs_root / "bus/pci/devices").mkdir(parents=True, exist_ok=True)
+    return sysfs_root, proc_root
+
+
+def get_profile(golemwz, tmp_path, gpus=(PASSTHROUGH_GPU,), **kwargs):
+    early_vfio = kwargs.pop("early_vfio", False)
+    sysfs_root, proc_root = make_host(tmp_path, **kwargs)
+    inputs = golemwz.get_kernel_profile_inputs(
+        list(gpus), sysfs_root, proc_root
+    )
+    profile = golemwz.derive_kernel_profile(inputs, early_vfio=early_vfio)
+    golemwz.validate_kernel_profile(profile)
+    assert profile[-1].startswith("golemwz.profile=")
+    return profile[:-1]
+
+
+def test_inputs_from_host(golemwz, tmp_path):
+    sysfs_root, proc_root = make_host(
+        tmp_path,
+        cpu_vendor="AuthenticAMD",
+        devices={
+            GPU: ("0x030000", True),
+            GPU_AUDIO: ("0x040300", False),
+            SECOND_GPU: ("0x030200", False),
+        },
+        # Legacy ports without UART are listed too
+        serial_ports={"ttyS0": 4, "ttyS1": 0},
+    )
+
+    assert golemwz.get_kernel_profile_inputs(
+        [PASSTHROUGH_GPU], sysfs_root, proc_root
+    ) == {
+        "cpu_vendor": "AuthenticAMD",
+        # Only VGA controllers, not 3D ones
+        "vga_devices": {GPU: True},
+        "serial_consoles": ["ttyS0"],
+        "passthrough_slots": [GPU, GPU_AUDIO],
+    }
+
+
+@pytest.mark.parametrize(
+    "cpu_vendor, iommu",
+    [
+        ("GenuineIntel", ["intel_iommu=on"]),
+        ("AuthenticAMD", ["amd_iommu=on"]),
+        ("HygonGenuine", ["intel_iommu=on", "amd_iommu=on"]),
+    ],
+)
+def test_iommu_follows_cpu_vendor(golemwz, tmp_path, cpu_vendor, iommu):
+    profile = get_profile(
+        golemwz,
+        tmp_path,
+        cpu_vendor=cpu_vendor,
+        devices={GPU: ("0x030000", False)},
+    )
+    assert profile == iommu + ["iommu=pt"]
+
+
+def test_single_gpu_boot_display_keeps_efifb(golemwz, tmp_path):
+    # The passthrough GPU is the only display, efifb is its boot console
+    profile = get_profile(
+        golemwz,
+        tmp_path,
+        devices={GPU: ("0x030000", True), GPU_AUDIO: ("0x040300", False)},
+    )
+    assert profile == ["intel_iommu=on", "iommu=pt"]
+
+
+def test_single_gpu_with_serial_console(golemwz, tmp_path):
+    profile = get_profile(
+        golemwz,
+        tmp_path,
+        devices={GPU: ("0x030000", True)},
+        serial_ports={"ttyS0": 0, "ttyS1": 4},
+    )
+    assert profile == [
+        "intel_iommu=on",
+        "iommu=pt",
+        "console=ttyS1,115200n8",
+        "console=tty0",
+    ]
+
+
+def test_boot_display_passed_through_with_host_gpu(golemwz, tmp_path):
+    profile = get_profile(
+        golemwz,
+        tmp_path,
+        devices={IGPU: ("0x030000", False), GPU: ("0x030000", True)},
+        serial_ports={"ttyS0": 4},
+    )
+    assert profile == [
+        "intel_iommu=on",
+        "iommu=pt",
+        "video=efifb:off",
+        "vfio-pci.disable_vga=1",
+        "console=tty0",
+    ]
+
+
+def test_host_gpu_is_boot_display(golemwz, tmp_path):
+    profile = get_profile(
+        golemwz,
+        tmp_path,
+        devices={IGPU: ("0x030000", True), GPU: ("0x030000", False)},
+    )
+    assert profile == [
+        "intel_iommu=on",
+        "iommu=pt",
+        "vfio-pci.disable_vga=1",
+        "console=tty0",
+    ]
+
+
+def test_early_vfio_lists_passthrough_devices(golemwz, tmp_path):
+    gpus = [
+        {"slot": SECOND_GPU, "vfio_devices": [SECOND_GPU]},
+        PASSTHROUGH_GPU,
+    ]
+    profile = get_profile(
+        golemwz,
+        tmp_path,
+        gpus=gpus,
+        devices={GPU: ("0x030000", True), SECOND_GPU: ("0x030000", False)},
+        early_vfio=True,
+    )
+    assert profile[-1] == f"golemwz.vfio={GPU},{GPU_AUDIO},{SECOND_GPU}"
+
+
+def test_profile_digest_follows_parameters(golemwz, tmp_path):
+    inputs = {
+        "cpu_vendor": "GenuineIntel",
+        "vga_devices": {IGPU: False, GPU: True},
+        "serial_consoles": [],
+        "passthrough_slots": [GPU],
+    }
+    profile = golemwz.derive_kernel_profile(inputs)
+    assert golemwz.derive_kernel_profile(dict(inputs)) == profile
+
+    inputs["vga_devices"] = {GPU: True}
+    other_profile = golemwz.derive_kernel_profile(inputs)
+    assert other_profile[-1] != profile[-1]
+
+
+def test_unsupported_parameters_are_rejected(golemwz):
+    with pytest.raises(golemwz.WizardError):
+        golemwz.validate_kernel_profile(["init=/bin/sh"])
+    with pytest.raises(golemwz.WizardError):
+        golemwz.validate_kernel_profile(["console=tty0 init=/bin/sh"])
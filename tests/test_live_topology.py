@@ -0,0 +1,228 @@
+"""
+Replay of recorded PCI uevents on the live topology: devices are added
+under their bridge like at boot, then unbound, rebound, removed and
+re-added on a fake sysfs.
+"""
+
+import itertools
+
+import pytest
+
+BRIDGE = "0000:00:01.0"
+GPU = "0000:01:00.0"
+GPU_AUDIO = "0000:01:00.1"
+
+DEVPATHS = {
+    BRIDGE: f"/devices/pci0000:00/{BRIDGE}",
+    GPU: f"/devices/pci0000:00/{BRIDGE}/{GPU}",
+    GPU_AUDIO: f"/devices/pci0000:00/{BRIDGE}/{GPU_AUDIO}",
+}
+PCI_IDS = {
+    BRIDGE: ("60400", "8086:A70D"),
+    GPU: ("30000", "10DE:2204"),
+    GPU_AUDIO: ("40300", "10DE:1AEF"),
+}
+
+
+def uevent(action, slot, driver=None):
+    pci_class, pci_id = PCI_IDS[slot]
+    event = {
+        "ACTION": action,
+        "DEVPATH": DEVPATHS[slot],
+        "SUBSYSTEM": "pci",
+        "PCI_CLASS": pci_class,
+        "PCI_ID": pci_id,
+        "PCI_SLOT_NAME": slot,
+    }
+    if driver:
+        event["DRIVER"] = driver
+    return event
+
+
+def raw_uevent(event):
+    # Netlink message of the kernel: 'action@devpath' header then fields
+    header = f"{event['ACTION']}@{event['DEVPATH']}"
+    fields = [f"{key}={value}" for key, value in event.items()]
+    return "\0".join([header] + fields).encode() + b"\0"
+
+
+COLDPLUG = [
+    uevent("add", BRIDGE, "pcieport"),
+    uevent("add", GPU),
+    uevent("add", GPU_AUDIO),
+    uevent("bind", GPU, "vfio-pci"),
+    uevent("bind", GPU_AUDIO, "vfio-pci"),
+]
+
+
+@pytest.fixture
+def topology(golemwz, tmp_path, monkeypatch):
+    sysfs_root = tmp_path / "sys"
+    devices_path = sysfs_root / "bus/pci/devices"
+    for slot, group in [(BRIDGE, "1"), (GPU, "14"), (GPU_AUDIO, "14")]:
+        group_path = sysfs_root / "kernel/iommu_groups" / group
+        group_path.mkdir(parents=True, exist_ok=True)
+        (devices_path / slot).mkdir(parents=True)
+        (devices_path / slot / "iommu_group").symlink_to(group_path)
+    # Device link between the GPU and its audio function
+    devlink_path = (
+        sysfs_root / "devices/virtual/devlink" / f"pci:{GPU}--pci:{GPU_AUDIO}"
+    )
+    devlink_path.mkdir(parents=True)
+    (devices_path / GPU / f"consumer:pci:{GPU_AUDIO}").symlink_to(devlink_path)
+
+    # Devices only come from the replayed events
+    monkeypatch.setattr(golemwz.LiveTopology, "_get_pci_devices", dict)
+    monkeypatch.setattr(
+        golemwz.LiveTopology,
+        "_get_description",
+        lambda self, slot: f"Device {slot}",
+    )
+    topology = golemwz.LiveTopology(sysfs_root=sysfs_root)
+    assert topology.get_devices() == []
+    for event in COLDPLUG:
+        topology.apply(event)
+    return topology
+
+
+def slots(devices):
+    return [device.slot for device in devices]
+
+
+def test_coldplug_builds_hierarchy_and_groups(golemwz, topology):
+    bridge, gpu = topology.get_device(BRIDGE), topology.get_device(GPU)
+
+    assert slots(topology.get_devices()) == [BRIDGE, GPU, GPU_AUDIO]
+    assert slots(topology.get_devices(golemwz.PCI_VGA_CLASS_ID)) == [GPU]
+    assert gpu.vendor == "10de" and gpu.device == "2204"
+    assert gpu.description == f"Device {GPU}"
+    assert gpu.parent is bridge
+    assert slots(bridge.children) == [GPU, GPU_AUDIO]
+    assert slots(gpu.consumers) == [GPU_AUDIO]
+    assert slots(topology.get_group(14)) == [GPU, GPU_AUDIO]
+    assert slots(topology.get_related_devices(gpu)) == [
+        BRIDGE,
+        GPU,
+        GPU_AUDIO,
+    ]
+    assert topology.is_isolated(gpu, relax=True)
+    assert topology.get_driver(GPU) == "vfio-pci"
+    assert topology.get_driver(BRIDGE) == "pcieport"
+
+
+def test_bind_and_unbind_update_driver(topology):
+    events = []
+    topology.listeners.append(
+        lambda action, device: events.append((action, device.slot))
+    )
+
+    topology.apply(uevent("unbind", GPU))
+    assert topology.get_driver(GPU) is None
+    topology.apply(uevent("bind", GPU, "nvidia"))
+    assert topology.get_driver(GPU) == "nvidia"
+    assert events == [("unbind", GPU), ("bind", GPU)]
+
+
+def test_remove_updates_graph_and_groups(topology):
+    gpu = topology.get_device(GPU)
+    consumers = gpu.consumers
+
+    topology.apply(uevent("remove", GPU_AUDIO))
+    assert topology.get_device(GPU_AUDIO) is None
+    assert slots(gpu.consumers) == []
+    assert slots(topology.get_group(14)) == [GPU]
+    assert slots(topology.get_device(BRIDGE).children) == [GPU]
+    # Lists obtained before the event are not modified
+    assert slots(consumers) == [GPU_AUDIO]
+
+    topology.apply(uevent("remove", GPU))
+    assert topology.get_group(14) == []
+    assert 14 not in topology.iommu_groups
+    assert slots(topology.get_devices()) == [BRIDGE]
+
+
+def test_readded_function_is_linked_again(topology):
+    topology.apply(uevent("remove", GPU_AUDIO))
+    topology.apply(uevent("add", GPU_AUDIO))
+
+    audio = topology.get_device(GPU_AUDIO)
+    assert slots(topology.get_device(GPU).consumers) == [GPU_AUDIO]
+    assert audio.parent is topology.get_device(BRIDGE)
+    assert slots(topology.get_group(14)) == [GPU, GPU_AUDIO]
+    # Not bound yet
+    assert topology.get_driver(GPU_AUDIO) is None
+
+
+def test_readded_bridge_keeps_devices_behind_it(topology):
+    old_bridge = topology.get_device(BRIDGE)
+
+    # e.g. a link reset of the bridge alone
+    topology.apply(uevent("add", BRIDGE, "pcieport"))
+
+    bridge, gpu = topology.get_device(BRIDGE), topology.get_device(GPU)
+    assert bridge is not old_bridge
+    assert slots(bridge.children) == [GPU, GPU_AUDIO]
+    assert gpu.parent is bridge
+    assert topology.get_device(GPU_AUDIO).parent is bridge
+    assert topology.get_parents(gpu) == [bridge]
+    assert slots(topology.get_group(1)) == [BRIDGE]
+    assert topology.get_driver(GPU) == "vfio-pci"
+
+
+def test_hot_unplugged_bridge_is_rebuilt(topology):
+    for slot in [GPU_AUDIO, GPU, BRIDGE]:
+        topology.apply(uevent("remove", slot))
+    assert topology.get_devices() == []
+
+    for event in COLDPLUG:
+        topology.apply(event)
+    bridge = topology.get_device(BRIDGE)
+    assert slots(bridge.children) == [GPU, GPU_AUDIO]
+    assert topology.get_device(GPU).parent is bridge
+    assert slots(topology.get_group(14)) == [GPU, GPU_AUDIO]
+
+
+def test_events_of_unknown_devices_are_ignored(topology):
+    unknown = {**uevent("bind", GPU, "vfio-pci"), "PCI_SLOT_NAME": "0000:09"}
+    assert topology.apply(unknown) is None
+    no_slot = {**uevent("remove", GPU), "PCI_SLOT_NAME": ""}
+    assert topology.apply(no_slot) is None
+    assert topology.apply(uevent("change", GPU)) is None
+    assert slots(topology.get_devices()) == [BRIDGE, GPU, GPU_AUDIO]
+
+
+class RecordedSocket:
+    def __init__(self, messages):
+        self.messages = iter(messages)
+
+    def recv(self, size):
+        return next(self.messages)
+
+
+def test_uevent_source_replay(golemwz, topology):
+    usb_event = {
+        "ACTION": "add",
+        "DEVPATH": "/devices/pci0000:00/0000:00:14.0/usb1/1-1",
+        "SUBSYSTEM": "usb",
+    }
+    messages = [
+        raw_uevent(uevent("unbind", GPU)),
+        # Re-broadcast by udev, the kernel message is used
+        b"libudev\0\xfe\xed\xca\xfe" + raw_uevent(uevent("unbind", GPU)),
+        raw_uevent(usb_event),
+        raw_uevent(uevent("bind", GPU, "vfio-pci")),
+        raw_uevent(uevent("remove", GPU_AUDIO)),
+    ]
+    source = golemwz.UeventSource.__new__(golemwz.UeventSource)
+    source.sock = RecordedSocket(messages)
+
+    events = list(itertools.islice(source, 3))
+    assert [(event["ACTION"], event["PCI_SLOT_NAME"]) for event in events] == [
+        ("unbind", GPU),
+        ("bind", GPU),
+        ("remove", GPU_AUDIO),
+    ]
+
+    topology.watch(events).join()
+    assert topology.get_driver(GPU) == "vfio-pci"
+    assert topology.get_device(GPU_AUDIO) is None
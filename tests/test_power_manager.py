@@ -0,0 +1,175 @@
+"""
+Runtime power management of idle passthrough GPUs on a fake sysfs, whose
+devices are under their bridge like in '/sys/devices', and a fake '/proc'
+whose processes hold '/dev/vfio' groups open.
+"""
+
+import json
+import os
+
+import pytest
+
+BRIDGE = "0000:00:01.0"
+GPU = "0000:01:00.0"
+GPU_AUDIO = "0000:01:00.1"
+GROUP = "14"
+
+
+@pytest.fixture
+def sysfs_root(tmp_path):
+    sysfs_root = tmp_path / "sys"
+    bridge_path = sysfs_root / "devices/pci0000:00" / BRIDGE
+    drivers_path = sysfs_root / "bus/pci/drivers"
+    (drivers_path / "vfio-pci").mkdir(parents=True)
+    (drivers_path / "pcieport").mkdir()
+    group_path = sysfs_root / "kernel/iommu_groups" / GROUP
+    group_path.mkdir(parents=True)
+    (sysfs_root / "bus/pci/devices").mkdir()
+    for slot, device_path, driver in [
+        (BRIDGE, bridge_path, "pcieport"),
+        (GPU, bridge_path / GPU, "vfio-pci"),
+        (GPU_AUDIO, bridge_path / GPU_AUDIO, "vfio-pci"),
+    ]:
+        (device_path / "power").mkdir(parents=True)
+        (device_path / "power/control").write_text("on\n")
+        (device_path / "power/runtime_status").write_text("active\n")
+        (device_path / "d3cold_allowed").write_text("0\n")
+        (device_path / "driver").symlink_to(drivers_path / driver)
+        if slot != BRIDGE:
+            (device_path / "iommu_group").symlink_to(group_path)
+        (sysfs_root / "bus/pci/devices" / slot).symlink_to(device_path)
+    return sysfs_root
+
+
+@pytest.fixture
+def proc_root(tmp_path):
+    proc_root = tmp_path / "proc"
+    fd_path = proc_root / "1" / "fd"
+    fd_path.mkdir(parents=True)
+    (fd_path / "0").symlink_to("/dev/null")
+    return proc_root
+
+
+def power_manager(golemwz, tmp_path, sysfs_root, proc_root, **kwargs):
+    return golemwz.PowerManager(
+        sysfs_root=sysfs_root,
+        proc_root=proc_root,
+        state_path=tmp_path / "power.json",
+        **kwargs,
+    )
+
+
+def read(sysfs_root, slot, name):
+    return (sysfs_root / "bus/pci/devices" / slot / name).read_text().strip()
+
+
+GPUS = [{"slot": GPU, "vfio_devices": [GPU, GPU_AUDIO]}]
+
+
+def test_idle_gpu_and_bridge_are_allowed_to_suspend(
+    golemwz, tmp_path, sysfs_root, proc_root
+):
+    manager = power_manager(golemwz, tmp_path, sysfs_root, proc_root)
+    manager.update(GPUS)
+
+    for slot in [GPU, GPU_AUDIO, BRIDGE]:
+        assert read(sysfs_root, slot, "power/control") == "auto"
+        assert read(sysfs_root, slot, "d3cold_allowed") == "1"
+    assert manager.state[GPU]["idle"] is True
+    saved = json.loads((tmp_path / "power.json").read_text())
+    assert saved[GPU]["kept_awake"] is False
+
+
+def test_gpu_used_by_a_vm_stays_on(golemwz, tmp_path, sysfs_root, proc_root):
+    os.symlink(f"/dev/vfio/{GROUP}", proc_root / "1" / "fd" / "1")
+    manager = power_manager(golemwz, tmp_path, sysfs_root, proc_root)
+    manager.update(GPUS)
+
+    for slot in [GPU, GPU_AUDIO, BRIDGE]:
+        assert read(sysfs_root, slot, "power/control") == "on"
+        assert read(sysfs_root, slot, "d3cold_allowed") == "0"
+    assert manager.state[GPU]["idle"] is False
+
+
+def test_gpu_not_bound_to_vfio_stays_on(
+    golemwz, tmp_path, sysfs_root, proc_root
+):
+    driver_path = sysfs_root / "bus/pci/devices" / GPU_AUDIO / "driver"
+    driver_path.unlink()
+    driver_path.symlink_to(sysfs_root / "bus/pci/drivers/pcieport")
+    manager = power_manager(golemwz, tmp_path, sysfs_root, proc_root)
+    manager.update(GPUS)
+
+    assert read(sysfs_root, GPU, "power/control") == "on"
+    assert manager.state[GPU]["idle"] is False
+
+
+@pytest.mark.parametrize("latency", [800.0, None])
+def test_slow_waking_gpu_is_kept_awake(
+    golemwz, tmp_path, sysfs_root, proc_root, monkeypatch, latency
+):
+    (sysfs_root / "bus/pci/devices" / GPU / "power/runtime_status").write_text(
+        "suspended\n"
+    )
+    # None: the GPU didn't wake up in time
+    monkeypatch.setattr(
+        golemwz.PowerManager, "measure_wake_latency", lambda self, s: latency
+    )
+    manager = power_manager(
+        golemwz, tmp_path, sysfs_root, proc_root, wake_budget_ms=500.0
+    )
+    manager.update(GPUS)
+
+    assert manager.state[GPU]["wake_latency_ms"] == latency
+    assert manager.state[GPU]["kept_awake"] is True
+    for slot in [GPU_AUDIO, BRIDGE]:
+        assert read(sysfs_root, slot, "power/control") == "on"
+        assert read(sysfs_root, slot, "d3cold_allowed") == "0"
+
+
+def test_wake_latency_within_budget_lets_gpu_suspend(
+    golemwz, tmp_path, sysfs_root, proc_root, monkeypatch
+):
+    (sysfs_root / "bus/pci/devices" / GPU / "power/runtime_status").write_text(
+        "suspended\n"
+    )
+    monkeypatch.setattr(
+        golemwz.PowerManager, "measure_wake_latency", lambda self, s: 20.0
+    )
+    manager = power_manager(golemwz, tmp_path, sysfs_root, proc_root)
+    manager.update(GPUS)
+
+    assert manager.state[GPU]["kept_awake"] is False
+    assert read(sysfs_root, GPU, "power/control") == "auto"
+
+
+def test_state_is_reloaded_on_restart(
+    golemwz, tmp_path, sysfs_root, proc_root, monkeypatch
+):
+    (sysfs_root / "bus/pci/devices" / GPU / "power/runtime_status").write_text(
+        "suspended\n"
+    )
+    monkeypatch.setattr(
+        golemwz.PowerManager, "measure_wake_latency", lambda self, s: 800.0
+    )
+    power_manager(golemwz, tmp_path, sysfs_root, proc_root).update(GPUS)
+
+    def measure_wake_latency(self, slot):
+        raise AssertionError("GPU woken up again")
+
+    # Restarted manager doesn't measure again and keeps the GPU awake
+    monkeypatch.setattr(
+        golemwz.PowerManager, "measure_wake_latency", measure_wake_latency
+    )
+    manager = power_manager(golemwz, tmp_path, sysfs_root, proc_root)
+    assert manager.state[GPU]["kept_awake"] is True
+    manager.update(GPUS)
+    assert read(sysfs_root, GPU, "power/control") == "on"
+
+
+def test_unreadable_state_starts_empty(
+    golemwz, tmp_path, sysfs_root, proc_root
+):
+    (tmp_path / "power.json").write_text("{")
+    manager = power_manager(golemwz, tmp_path, sysfs_root, proc_root)
+    assert manager.state == {}
@@ -0,0 +1,179 @@
+"""
+VFIO readiness of a passthrough GPU on fake sysfs and '/dev' trees, the
+VFIO_GROUP_GET_STATUS ioctl is stubbed.
+"""
+
+import errno
+import os
+
+import pytest
+
+GPU = "0000:01:00.0"
+GPU_AUDIO = "0000:01:00.1"
+BRIDGE = "0000:00:01.0"
+GROUP = "14"
+
+GPU_CONF = {"slot": GPU, "vfio_devices": [GPU, GPU_AUDIO]}
+
+
+@pytest.fixture
+def sysfs_root(tmp_path):
+    sysfs_root = tmp_path / "sys"
+    group_path = sysfs_root / "kernel/iommu_groups" / GROUP
+    (group_path / "devices").mkdir(parents=True)
+    for slot, driver in [
+        (GPU, "vfio-pci"),
+        (GPU_AUDIO, "vfio-pci"),
+        (BRIDGE, "pcieport"),
+    ]:
+        set_driver(sysfs_root, slot, driver)
+        device_path = sysfs_root / "bus/pci/devices" / slot
+        (device_path / "iommu_group").symlink_to(group_path)
+        (group_path / "devices" / slot).symlink_to(device_path)
+    (sysfs_root / "bus/pci/devices" / GPU / "reset_method").write_text(
+        "flr bus\n"
+    )
+    return sysfs_root
+
+
+@pytest.fixture
+def dev_root(tmp_path):
+    dev_root = tmp_path / "dev"
+    (dev_root / "vfio").mkdir(parents=True)
+    (dev_root / "vfio" / GROUP).touch()
+    return dev_root
+
+
+def set_driver(sysfs_root, slot, driver):
+    device_path = sysfs_root / "bus/pci/devices" / slot
+    device_path.mkdir(parents=True, exist_ok=True)
+    driver_path = device_path / "driver"
+    if driver_path.is_symlink():
+        driver_path.unlink()
+    if driver:
+        (sysfs_root / "bus/pci/drivers" / driver).mkdir(
+            parents=True, exist_ok=True
+        )
+        driver_path.symlink_to(sysfs_root / "bus/pci/drivers" / driver)
+
+
+@pytest.fixture
+def group_status(golemwz, monkeypatch):
+    """
+    Flags returned by the stubbed ioctl, or the errno it fails with.
+    """
+    status = {"flags": golemwz.VFIO_GROUP_FLAGS_VIABLE, "errno": None}
+
+    def ioctl(fd, request, buffer):
+        assert request == golemwz.VFIO_GROUP_GET_STATUS
+        assert int.from_bytes(buffer[:4], "little") == 8
+        if status["errno"]:
+            raise OSError(status["errno"], os.strerror(status["errno"]))
+        buffer[4:] = status["flags"].to_bytes(4, "little")
+        return 0
+
+    monkeypatch.setattr(golemwz.fcntl, "ioctl", ioctl)
+    return status
+
+
+def probe(golemwz, sysfs_root, dev_root):
+    return golemwz.probe_vfio_readiness(GPU_CONF, sysfs_root, dev_root)
+
+
+def test_ready(golemwz, sysfs_root, dev_root, group_status):
+    assert probe(golemwz, sysfs_root, dev_root) == {
+        "slot": GPU,
+        "problems": [],
+        "iommu_group": int(GROUP),
+        "reset_method": "flr bus",
+        "ready": True,
+    }
+
+
+def test_group_not_viable(golemwz, sysfs_root, dev_root, group_status):
+    group_status["flags"] = 0
+    readiness = probe(golemwz, sysfs_root, dev_root)
+    assert readiness["problems"] == ["IOMMU group is not viable."]
+    assert readiness["ready"] is False
+
+
+def test_group_opened_by_a_vm(
+    golemwz, sysfs_root, dev_root, group_status, monkeypatch
+):
+    group_dev_path = dev_root / "vfio" / GROUP
+    os_open = os.open
+
+    def busy_open(path, flags, *args):
+        if path == group_dev_path:
+            raise OSError(errno.EBUSY, os.strerror(errno.EBUSY))
+        return os_open(path, flags, *args)
+
+    monkeypatch.setattr(golemwz.os, "open", busy_open)
+    readiness = probe(golemwz, sysfs_root, dev_root)
+    assert readiness["problems"] == []
+    assert readiness["ready"] is True
+
+
+def test_group_device_missing(golemwz, sysfs_root, dev_root, group_status):
+    (dev_root / "vfio" / GROUP).unlink()
+    readiness = probe(golemwz, sysfs_root, dev_root)
+    assert readiness["problems"] == [
+        f"Cannot open '{dev_root / 'vfio' / GROUP}': No such file or "
+        "directory."
+    ]
+    assert readiness["ready"] is False
+
+
+def test_not_a_vfio_group_device(golemwz, sysfs_root, dev_root, group_status):
+    # ENOTTY: the member drivers are relied on
+    group_status["errno"] = errno.ENOTTY
+    assert probe(golemwz, sysfs_root, dev_root)["ready"] is True
+
+
+def test_group_status_error(golemwz, sysfs_root, dev_root, group_status):
+    group_status["errno"] = errno.EINVAL
+    readiness = probe(golemwz, sysfs_root, dev_root)
+    assert readiness["problems"] == [
+        "Cannot get IOMMU group status: Invalid argument."
+    ]
+    assert readiness["ready"] is False
+
+
+@pytest.mark.parametrize(
+    "driver, slot, problem",
+    [
+        ("snd_hda_intel", GPU_AUDIO, "'{}' is not bound to vfio-pci."),
+        (None, GPU_AUDIO, "'{}' is not bound to vfio-pci."),
+        ("xhci_hcd", BRIDGE, "'{}' is bound to host driver 'xhci_hcd'."),
+    ],
+)
+def test_group_member_held_by_host(
+    golemwz, sysfs_root, dev_root, group_status, driver, slot, problem
+):
+    set_driver(sysfs_root, slot, driver)
+    readiness = probe(golemwz, sysfs_root, dev_root)
+    assert readiness["problems"] == [problem.format(slot)]
+    assert readiness["ready"] is False
+
+
+def test_reset_method(golemwz, sysfs_root, dev_root, group_status):
+    device_path = sysfs_root / "bus/pci/devices" / GPU
+    (device_path / "reset_method").unlink()
+    readiness = probe(golemwz, sysfs_root, dev_root)
+    assert readiness["reset_method"] == ""
+    assert readiness["problems"] == ["No reset method available."]
+
+    # Older kernels only have 'reset'
+    (device_path / "reset").touch()
+    readiness = probe(golemwz, sysfs_root, dev_root)
+    assert readiness["reset_method"] == "unknown"
+    assert readiness["ready"] is True
+
+
+def test_no_iommu_group(golemwz, sysfs_root, dev_root, group_status):
+    (sysfs_root / "bus/pci/devices" / GPU / "iommu_group").unlink()
+    assert probe(golemwz, sysfs_root, dev_root) == {
+        "slot": GPU,
+        "problems": ["No IOMMU group."],
+        "ready": False,
+    }